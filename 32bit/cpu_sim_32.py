@@ -1,25 +1,44 @@
 import time
 import os
 import sys
-sys.path.insert(1, '..')
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import pygame
 from pygame.locals import *
 import numpy as np
 
-from cpu_sim import Computer, BitDisplay, Game
+from cpu_sim import Computer, BitDisplay, Game, PagedMemory, byte_view, render_cached, convert_surface, FONT_DIR
 
 
 class Computer_32(Computer):
     """ A version of the Computer class which allows for changing the number of
     bits used for the registers and the bus.
     """
+    __slots__ = ("bits",)
+
     def __init__(self, progload, bits = 8,
                  bits_stackpointer = 4,
                  stackpointer_start = None):
         self.bits = bits
         self.bits_stackpointer = bits_stackpointer
-        self.memory = np.zeros(2**bits, dtype = np.uint64)
+        self.stack_mask = 2**bits_stackpointer - 1
+        """ Smallest unsigned type that holds a word, as for the base computer """
+        if bits <= 8:
+            dtype = np.uint8
+        elif bits <= 16:
+            dtype = np.uint16
+        elif bits <= 32:
+            dtype = np.uint32
+        else:
+            dtype = np.uint64
+        if bits <= 24:
+            self.memory = np.zeros(2**bits, dtype = dtype)
+            self.memory_bytes = byte_view(self.memory)
+        else:
+            """ Too large to allocate all at once """
+            self.memory = PagedMemory(bits, dtype)
+            self.memory_bytes = byte_view(self.memory.first_page)
+        self.mem_version = 0
         self.get_mem_strings()
         self.overflow_limit = 2**bits
 
@@ -49,10 +68,10 @@ class Game_32(Game):
 
     def setup_fonts(self):
         pygame.font.init()
-        self._font_exobold = pygame.font.Font(os.path.join(os.getcwd(), "..", "font", "ExoBold-qxl5.otf"), 19)
-        self._font_exobold_small = pygame.font.Font(os.path.join(os.getcwd(), "..", "font", "ExoBold-qxl5.otf"), 13)
-        self._font_brush = pygame.font.Font(os.path.join(os.getcwd(), "..", "font", "BrushSpidol.otf"), 25)
-        self._font_segmentdisplay = pygame.font.Font(os.path.join(os.getcwd(), "..", "font", "28segment.ttf"), 80)
+        self._font_exobold = pygame.font.Font(os.path.join(FONT_DIR, "ExoBold-qxl5.otf"), 19)
+        self._font_exobold_small = pygame.font.Font(os.path.join(FONT_DIR, "ExoBold-qxl5.otf"), 13)
+        self._font_brush = pygame.font.Font(os.path.join(FONT_DIR, "BrushSpidol.otf"), 25)
+        self._font_segmentdisplay = pygame.font.Font(os.path.join(FONT_DIR, "28segment.ttf"), 80)
         self._font_console_bold = pygame.font.SysFont("monospace", 17, bold = True)
         self._font_small_console = pygame.font.SysFont("monospace", 11)
         self._font_small_console_bold = pygame.font.SysFont("monospace", 11, bold = True, italic = True)
@@ -60,22 +79,22 @@ class Game_32(Game):
         self._font_verysmall_console_bold = pygame.font.SysFont("monospace", 10, bold = True)
         self._font_veryverysmall_console = pygame.font.SysFont("monospace", 9)
         self._font_veryverysmall_console_bold = pygame.font.SysFont("monospace", 9, bold = True)
-        self._font_small = pygame.font.Font(os.path.join(os.getcwd(), "..", "font", "Amble-Bold.ttf"), 11)
-        self._font = pygame.font.Font(os.path.join(os.getcwd(), "..", "font", "Amble-Bold.ttf"), 16)
-        self._font_large = pygame.font.Font(os.path.join(os.getcwd(), "..", "font", "Amble-Bold.ttf"), 25)
-        self._font_larger = pygame.font.Font(os.path.join(os.getcwd(), "..", "font", "Amble-Bold.ttf"), 45)
-        self._font_verylarge = pygame.font.Font(os.path.join(os.getcwd(), "..", "font", "Amble-Bold.ttf"), 64)
+        self._font_small = pygame.font.Font(os.path.join(FONT_DIR, "Amble-Bold.ttf"), 11)
+        self._font = pygame.font.Font(os.path.join(FONT_DIR, "Amble-Bold.ttf"), 16)
+        self._font_large = pygame.font.Font(os.path.join(FONT_DIR, "Amble-Bold.ttf"), 25)
+        self._font_larger = pygame.font.Font(os.path.join(FONT_DIR, "Amble-Bold.ttf"), 45)
+        self._font_verylarge = pygame.font.Font(os.path.join(FONT_DIR, "Amble-Bold.ttf"), 64)
 
     def init_game(self):
         pygame.init()
         pygame.display.set_caption("8 bit computer")
 
-        self._screen = pygame.display.set_mode(self._size, pygame.HWSURFACE | pygame.DOUBLEBUF)
+        self._screen = pygame.display.set_mode(self._size)
         self._running = True
 
         self.setup_fonts()
 
-        self._bg = pygame.Surface(self._size)
+        self._bg = pygame.Surface(self._size).convert()
         self._bg.fill((20, 20, 20))
         self._clock = pygame.time.Clock()
 
@@ -250,26 +269,54 @@ class Game_32(Game):
 
         for i in range(32):
             rowtext = f"{i*8:>03d}"
-            self.memrows.append(self._font_verysmall_console_bold.render(rowtext, True, self.TEXTGREY))
+            self.memrows.append(render_cached(self._font_verysmall_console_bold, rowtext, self.TEXTGREY))
         
-        self.memcolumn = self._font_verysmall_console_bold.render(memcolumn, True, self.TEXTGREY)
-        self.memory_title = self._font_exobold.render("Memory:", True, self.TEXTGREY)
+        self.memcolumn = convert_surface(self._font_verysmall_console_bold.render(memcolumn, True, self.TEXTGREY))
+        self.memory_title = convert_surface(self._font_exobold.render("Memory:", True, self.TEXTGREY))
+        memwidth = self.memcolumn.get_width()
+        titlewidth = self.memory_title.get_width()
+        self._memory_label_blits = [(self.memory_title, (1210 + memwidth/2 - titlewidth/2, 5)),
+                                    (self.memcolumn, (1210, 57 - 18))]
+        self._memory_label_blits += [(memrow, (1210 - 22, 57 + i*15)) for i, memrow in enumerate(self.memrows)]
+        self._last_mem_version = None
+        self._last_mem_strings = [None]*32
+        mem_rect = self.memory_rect()
+        self._mem_cached_surface = convert_surface(pygame.Surface((mem_rect.width - 22, 32*15), pygame.SRCALPHA))
 
         self._start_time = time.time()
+        self._plain_bg = self._bg.copy()
+        self.paint_static()
+        self.setup_dirty_rects()
+
+    def memory_rect(self):
+        """ Returns the rectangle covered by the memory display """
+        x = 1210
+        y = 57
+        row_width = max(self._font_verysmall_console.size(f"{c*8} "*8)[0]
+                        for c in "0123456789abcdef")
+        width = max(row_width, self.memcolumn.get_width())
+        return pygame.Rect(x - 22, 5, width + 22, y + 32*15 - 5)
 
     def draw_memory(self):
-        memwidth = self.memcolumn.get_width()
-        titlewidth = self.memory_title.get_width()
-        self.computer.get_mem_strings(32, 8, False, 8)
+        """ Draws the memory contents. The memory rows are rendered onto a
+        single surface. When the memory has been written to since the last
+        time it was drawn, the rows whose text has changed are redrawn on it.
+        The titles and row labels are painted on the background.
+        """
         x = 1210
         y = 57
-        self._screen.blit(self.memory_title, (x + memwidth/2 - titlewidth/2, 5))
-        self._screen.blit(self.memcolumn, (x, y - 18))
-        for i, item in enumerate(self.computer.mem_strings):
-            out_text = self._font_verysmall_console.render(item, True, self.TEXTGREY)
-            self._screen.blit(out_text, (x, y))
-            self._screen.blit(self.memrows[i], (x - 22, y))
-            y += 15
+        if self.computer.mem_version != self._last_mem_version:
+            mem_strings = self.computer.get_mem_strings(32, 8, False, 8)
+            width = self._mem_cached_surface.get_width()
+            for i, item in enumerate(mem_strings):
+                if item != self._last_mem_strings[i]:
+                    out_text = render_cached(self._font_verysmall_console, item, self.TEXTGREY)
+                    self._mem_cached_surface.fill((0, 0, 0, 0), (0, i*15, width, 15))
+                    self._mem_cached_surface.blit(out_text, (0, i*15))
+            self._last_mem_strings = mem_strings
+            self._last_mem_version = self.computer.mem_version
+
+        self._screen.blit(self._mem_cached_surface, (x, y))
 
 
 if __name__ == "__main__":
@@ -1,25 +1,44 @@
 import time
 import os
 import sys
-sys.path.insert(1, '..')
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import pygame
 from pygame.locals import *
 import numpy as np
 
-from cpu_sim import Computer, BitDisplay, Game
+from cpu_sim import Computer, BitDisplay, Game, PagedMemory, byte_view, render_cached, convert_surface, FONT_DIR
 
 
 class Computer_32(Computer):
     """ A version of the Computer class which allows for changing the number of
     bits used for the registers and the bus.
     """
+    __slots__ = ("bits",)
+
     def __init__(self, progload, bits = 8,
                  bits_stackpointer = 4,
                  stackpointer_start = None):
         self.bits = bits
         self.bits_stackpointer = bits_stackpointer
-        self.memory = np.zeros(2**bits, dtype = np.uint64)
+        self.stack_mask = 2**bits_stackpointer - 1
+        """ Smallest unsigned type that holds a word, as for the base computer """
+        if bits <= 8:
+            dtype = np.uint8
+        elif bits <= 16:
+            dtype = np.uint16
+        elif bits <= 32:
+            dtype = np.uint32
+        else:
+            dtype = np.uint64
+        if bits <= 24:
+            self.memory = np.zeros(2**bits, dtype = dtype)
+            self.memory_bytes = byte_view(self.memory)
+        else:
+            """ Too large to allocate all at once """
+            self.memory = PagedMemory(bits, dtype)
+            self.memory_bytes = byte_view(self.memory.first_page)
+        self.mem_version = 0
         self.get_mem_strings()
         self.overflow_limit = 2**bits
 
@@ -49,10 +68,10 @@ class Game_32(Game):
 
     def setup_fonts(self):
         pygame.font.init()
-        self._font_exobold = pygame.font.Font(os.path.join(os.getcwd(), "..", "font", "ExoBold-qxl5.otf"), 19)
-        self._font_exobold_small = pygame.font.Font(os.path.join(os.getcwd(), "..", "font", "ExoBold-qxl5.otf"), 13)
-        self._font_brush = pygame.font.Font(os.path.join(os.getcwd(), "..", "font", "BrushSpidol.otf"), 25)
-        self._font_segmentdisplay = pygame.font.Font(os.path.join(os.getcwd(), "..", "font", "28segment.ttf"), 80)
+        self._font_exobold = pygame.font.Font(os.path.join(FONT_DIR, "ExoBold-qxl5.otf"), 19)
+        self._font_exobold_small = pygame.font.Font(os.path.join(FONT_DIR, "ExoBold-qxl5.otf"), 13)
+        self._font_brush = pygame.font.Font(os.path.join(FONT_DIR, "BrushSpidol.otf"), 25)
+        self._font_segmentdisplay = pygame.font.Font(os.path.join(FONT_DIR, "28segment.ttf"), 80)
         self._font_console_bold = pygame.font.SysFont("monospace", 17, bold = True)
         self._font_small_console = pygame.font.SysFont("monospace", 11)
         self._font_small_console_bold = pygame.font.SysFont("monospace", 11, bold = True, italic = True)
@@ -61,22 +80,22 @@ class Game_32(Game):
         self._font_verysmall_console_bold = pygame.font.SysFont("monospace", 10, bold = True)
         self._font_veryverysmall_console = pygame.font.SysFont("monospace", 9)
         self._font_veryverysmall_console_bold = pygame.font.SysFont("monospace", 9, bold = True)
-        self._font_small = pygame.font.Font(os.path.join(os.getcwd(), "..", "font", "Amble-Bold.ttf"), 11)
-        self._font = pygame.font.Font(os.path.join(os.getcwd(), "..", "font", "Amble-Bold.ttf"), 16)
-        self._font_large = pygame.font.Font(os.path.join(os.getcwd(), "..", "font", "Amble-Bold.ttf"), 25)
-        self._font_larger = pygame.font.Font(os.path.join(os.getcwd(), "..", "font", "Amble-Bold.ttf"), 45)
-        self._font_verylarge = pygame.font.Font(os.path.join(os.getcwd(), "..", "font", "Amble-Bold.ttf"), 64)
+        self._font_small = pygame.font.Font(os.path.join(FONT_DIR, "Amble-Bold.ttf"), 11)
+        self._font = pygame.font.Font(os.path.join(FONT_DIR, "Amble-Bold.ttf"), 16)
+        self._font_large = pygame.font.Font(os.path.join(FONT_DIR, "Amble-Bold.ttf"), 25)
+        self._font_larger = pygame.font.Font(os.path.join(FONT_DIR, "Amble-Bold.ttf"), 45)
+        self._font_verylarge = pygame.font.Font(os.path.join(FONT_DIR, "Amble-Bold.ttf"), 64)
 
     def init_game(self):
         pygame.init()
         pygame.display.set_caption("8 bit computer")
 
-        self._screen = pygame.display.set_mode(self._size, pygame.HWSURFACE | pygame.DOUBLEBUF)
+        self._screen = pygame.display.set_mode(self._size)
         self._running = True
 
         self.setup_fonts()
 
-        self._bg = pygame.Surface(self._size)
+        self._bg = pygame.Surface(self._size).convert()
         self._bg.fill((20, 20, 20))
         self._clock = pygame.time.Clock()
 
@@ -243,8 +262,9 @@ class Game_32(Game):
 
         self.make_static_graphics()
         self.LCD_display = Monitor(self._font_small_console_bold2, position = (1210, 25))
+        """ Each row of the keyboard as an integer, with one bit per key """
         self.keyboard_numbers = [0, 0, 0, 0, 0]
-        self.keyboard = np.zeros((5, 11))
+        self._last_kb_hit = None
 
         self.keyboard_rows_list = []
         for i in range(5):
@@ -267,6 +287,25 @@ class Game_32(Game):
                                                                         True,
                                                                         self.WHITE))
 
+        """ Key centers and squared radii, for testing all keys against the
+        mouse position at once
+        """
+        self._kb_xs = np.array([x for kbr in self.keyboard_rows_list for x in kbr.xvalues], dtype = np.int32)
+        self._kb_ys = np.array([kbr.y for kbr in self.keyboard_rows_list for x in kbr.xvalues], dtype = np.int32)
+        self._kb_r2 = np.array([kbr.radius**2 for kbr in self.keyboard_rows_list for x in kbr.xvalues], dtype = np.int32)
+
+        """ All the key labels composited onto one surface """
+        label_blits = []
+        for kp_text, x, y in zip(self.keyboard_texts_rendered, self._kb_xs, self._kb_ys):
+            text_x = int(x - kp_text.get_width() / 2)
+            text_y = int(y - kp_text.get_height() / 2)
+            label_blits.append((kp_text, pygame.Rect((text_x, text_y), kp_text.get_size())))
+        label_rect = label_blits[0][1].unionall([rect for text, rect in label_blits])
+        self._kb_label_surface = convert_surface(pygame.Surface(label_rect.size, pygame.SRCALPHA))
+        self._kb_label_pos = label_rect.topleft
+        for kp_text, rect in label_blits:
+            self._kb_label_surface.blit(kp_text, rect.move(-label_rect.left, -label_rect.top))
+
         memcolumn = ""
         self.memrows = []
         for i in range(8):
@@ -275,26 +314,54 @@ class Game_32(Game):
 
         for i in range(32):
             rowtext = f"{i*8:>03d}"
-            self.memrows.append(self._font_verysmall_console_bold.render(rowtext, True, self.TEXTGREY))
+            self.memrows.append(render_cached(self._font_verysmall_console_bold, rowtext, self.TEXTGREY))
         
-        self.memcolumn = self._font_verysmall_console_bold.render(memcolumn, True, self.TEXTGREY)
-        self.memory_title = self._font_exobold.render("Memory:", True, self.TEXTGREY)
+        self.memcolumn = convert_surface(self._font_verysmall_console_bold.render(memcolumn, True, self.TEXTGREY))
+        self.memory_title = convert_surface(self._font_exobold.render("Memory:", True, self.TEXTGREY))
+        memwidth = self.memcolumn.get_width()
+        titlewidth = self.memory_title.get_width()
+        self._memory_label_blits = [(self.memory_title, (1210 + memwidth/2 - titlewidth/2, 5)),
+                                    (self.memcolumn, (1210, 57 - 18))]
+        self._memory_label_blits += [(memrow, (1210 - 22, 57 + i*15)) for i, memrow in enumerate(self.memrows)]
+        self._last_mem_version = None
+        self._last_mem_strings = [None]*32
+        mem_rect = self.memory_rect()
+        self._mem_cached_surface = convert_surface(pygame.Surface((mem_rect.width - 22, 32*15), pygame.SRCALPHA))
 
         self._start_time = time.time()
+        self._plain_bg = self._bg.copy()
+        self.paint_static()
+        self.setup_dirty_rects()
+
+    def memory_rect(self):
+        """ Returns the rectangle covered by the memory display """
+        x = 1210
+        y = 57
+        row_width = max(self._font_verysmall_console.size(f"{c*8} "*8)[0]
+                        for c in "0123456789abcdef")
+        width = max(row_width, self.memcolumn.get_width())
+        return pygame.Rect(x - 22, 5, width + 22, y + 32*15 - 5)
 
     def draw_memory(self):
-        memwidth = self.memcolumn.get_width()
-        titlewidth = self.memory_title.get_width()
-        self.computer.get_mem_strings(32, 8, False, 8)
+        """ Draws the memory contents. The memory rows are rendered onto a
+        single surface. When the memory has been written to since the last
+        time it was drawn, the rows whose text has changed are redrawn on it.
+        The titles and row labels are painted on the background.
+        """
         x = 1210
         y = 57
-        self._screen.blit(self.memory_title, (x + memwidth/2 - titlewidth/2, 5))
-        self._screen.blit(self.memcolumn, (x, y - 18))
-        for i, item in enumerate(self.computer.mem_strings):
-            out_text = self._font_verysmall_console.render(item, True, self.TEXTGREY)
-            self._screen.blit(out_text, (x, y))
-            self._screen.blit(self.memrows[i], (x - 22, y))
-            y += 15
+        if self.computer.mem_version != self._last_mem_version:
+            mem_strings = self.computer.get_mem_strings(32, 8, False, 8)
+            width = self._mem_cached_surface.get_width()
+            for i, item in enumerate(mem_strings):
+                if item != self._last_mem_strings[i]:
+                    out_text = render_cached(self._font_verysmall_console, item, self.TEXTGREY)
+                    self._mem_cached_surface.fill((0, 0, 0, 0), (0, i*15, width, 15))
+                    self._mem_cached_surface.blit(out_text, (0, i*15))
+            self._last_mem_strings = mem_strings
+            self._last_mem_version = self.computer.mem_version
+
+        self._screen.blit(self._mem_cached_surface, (x, y))
 
     def loop(self):
         kb_input = (self.kbrow-1)*11 + self.kbcol
@@ -304,78 +371,102 @@ class Game_32(Game):
             self.computer.input_regi = 0
         super().loop()
 
+    def dirty_regions(self):
+        """ The monitor is left out, as it is only updated on the display
+        when it has changed
+        """
+        return [rect for rect in super().dirty_regions() if rect != self.LCD_display.bg_border]
+
+    def setup_dirty_rects(self):
+        """ The monitor is restored from the background every frame like the
+        other dirty regions
+        """
+        super().setup_dirty_rects()
+        if self.use_LCD_display:
+            monitor_rect = self.LCD_display.bg_border
+            self._dirty_rects.append(monitor_rect)
+            self._bg_blits.append((self._bg, monitor_rect, monitor_rect))
+
+    def bit_displays(self):
+        """ The keypad is replaced by the keyboard """
+        keypad = self.keypad_rows + [self.keypad0, self.keypad_div]
+        displays = [display for display in super().bit_displays() if display not in keypad]
+        return displays + self.keyboard_rows_list
+
     def render(self):
-        self._screen.blit(self._bg, (0,0))
+        self.clear_screen()
 
         """ Draw LED displays """
         #self.clk_display.draw_number(self.computer.timer_indicator, self._screen)
-        self.bus_display.draw_number(self.computer.bus, self._screen)
-        self.cnt_display.draw_number(self.computer.prog_count, self._screen)
-        self.areg_display.draw_number(self.computer.areg, self._screen)
-        self.breg_display.draw_number(self.computer.breg, self._screen)
-        self.sreg_display.draw_number(self.computer.sumreg, self._screen)
-        self.flag_display.draw_number(self.computer.flags, self._screen)
-        self.flgr_display.draw_number(self.computer.flagreg, self._screen)
-        self.madd_display.draw_number(self.computer.memaddress, self._screen)
-        self.mcon_display.draw_number(self.computer.memcontent, self._screen)
-        self.insa_display.draw_number(self.computer.inst_reg_a, self._screen)
-        self.insb_display.draw_number(self.computer.inst_reg_b, self._screen)
-        self.outp_display.draw_number(self.computer.out_regist, self._screen)
-        self.inpt_display.draw_number(self.computer.input_regi, self._screen)
-        self.stap_display.draw_number(self.computer.stackpointer, self._screen)
+        self.draw_display(self.bus_display, self.computer.bus)
+        self.draw_display(self.cnt_display, self.computer.prog_count)
+        self.draw_display(self.areg_display, self.computer.areg)
+        self.draw_display(self.breg_display, self.computer.breg)
+        self.draw_display(self.sreg_display, self.computer.sumreg)
+        self.draw_display(self.flag_display, self.computer.flags)
+        self.draw_display(self.flgr_display, self.computer.flagreg)
+        self.draw_display(self.madd_display, self.computer.memaddress)
+        self.draw_display(self.mcon_display, self.computer.memcontent)
+        self.draw_display(self.insa_display, self.computer.inst_reg_a)
+        self.draw_display(self.insb_display, self.computer.inst_reg_b)
+        self.draw_display(self.outp_display, self.computer.out_regist)
+        self.draw_display(self.inpt_display, self.computer.input_regi)
+        self.draw_display(self.stap_display, self.computer.stackpointer)
 
         """ LCD display registers """
         if self.use_LCD_display:
-            self.disd_display.draw_number(self.computer.screen_data, self._screen)
-            self.disc_display.draw_number(self.computer.screen_control, self._screen)
+            self.draw_display(self.disd_display, self.computer.screen_data)
+            self.draw_display(self.disc_display, self.computer.screen_control)
 
         """ Draw and check the keyboard buttons for input """
-        i = 0
         for kp, num in zip(self.keyboard_rows_list, self.keyboard_numbers):
-            kp.draw_number(num, self._screen)
-            self.keyboard_numbers[i] = 0
-            i += 1
-        
-        self.keyboard[:,:] = 0
+            self.draw_display(kp, num)
+
+        """ Only the key pressed in the last frame has to be released """
+        if self._last_kb_hit is not None:
+            row, column = self._last_kb_hit
+            self.keyboard_numbers[row] = 0
+            self._last_kb_hit = None
         self.kbrow = 0
         self.kbcol = 0
-        for i, kp_text in enumerate(self.keyboard_texts_rendered):
-            column = i%11
-            row = i//11
-            kp = self.keyboard_rows_list[row]
-            x = kp.xvalues[column]
-            y = kp.y
-            mouse_dist = (self.mouse_pos[0] - x)**2 + (self.mouse_pos[1] - y)**2
-            if mouse_dist < kp.radius**2:
-                if pygame.mouse.get_pressed()[0]:
-                    self.keyboard_numbers[row] = 2**(10 - column)
-                    self.keyboard[row, column] = 1
-                    self.kbrow = row + 1
-                    self.kbcol = column
-
-            text_x = x - kp_text.get_width() / 2
-            text_y = y - kp_text.get_height() / 2
-            self._screen.blit(kp_text, (text_x, text_y))
+        if self.mouse_down:
+            mouse_dist = (self._kb_xs - self.mouse_pos[0])**2 + (self._kb_ys - self.mouse_pos[1])**2
+            keys_hit = np.flatnonzero(mouse_dist < self._kb_r2)
+        else:
+            keys_hit = ()
+        if len(keys_hit) > 0:
+            row, column = divmod(int(keys_hit[-1]), 11)
+            self.keyboard_numbers[row] = 1 << (10 - column)
+            self.kbrow = row + 1
+            self.kbcol = column
+            self._last_kb_hit = (row, column)
+
+        self._screen.blit(self._kb_label_surface, self._kb_label_pos)
 
         
 
-        """ Draw the output display """
-        out_string = f"{self.computer.out_regist:>03d}"
-        out_text = self._font_segmentdisplay.render(out_string, True, self.BRIGHTRED)
-        screen_bg = pygame.Rect(980, 480, out_text.get_width() + 35, out_text.get_height() + 25)
-        pygame.draw.rect(self._screen, self.BLACK, screen_bg, border_radius = 10)
-        self._screen.blit(out_text, (1000, 500))
+        """ Draw the output display, which is only redrawn when the output
+        register changes
+        """
+        if self.computer.out_regist != self._out_regist_rendered:
+            out_string = f"{self.computer.out_regist:>03d}"
+            out_text = render_cached(self._font_segmentdisplay, out_string, self.BRIGHTRED)
+            self._out_display = convert_surface(pygame.Surface((out_text.get_width() + 35, out_text.get_height() + 25),
+                                                               pygame.SRCALPHA))
+            pygame.draw.rect(self._out_display, self.BLACK, self._out_display.get_rect(), border_radius = 10)
+            self._out_display.blit(out_text, (20, 20))
+            self._out_regist_rendered = self.computer.out_regist
+        self._screen.blit(self._out_display, (980, 480))
 
         """ Draw the control word LED display, and the labels """
-        self.ctrl_display.draw_number(self.computer.controlword, self._screen)
+        self.draw_display(self.ctrl_display, self.computer.controlword)
         for text, x_center in zip(self.ctrl_word_text_rendered, self.ctrl_display.xvalues):
             text_x = int(x_center - text.get_width()/2)
             text_y = int(self.ctrl_display.y + text.get_height()) + 5
             self._screen.blit(text, (text_x, text_y))
 
         """ Draw the operation timestep LED display """
-        operation = int("1" + "0"*self.computer.op_timestep)
-        self.oprt_display.draw_bits(operation, self._screen)
+        self.draw_display(self.oprt_display, 1 << self.computer.op_timestep)
 
         """ If the timestep is zero, update which instruction from the program
         is the active one (to draw with green)
@@ -386,50 +477,44 @@ class Game_32(Game):
         """ Draw the memory """
         if self.draw_mem:
             self.draw_memory()
+            if self.computer.mem_version != self._mem_rect_version:
+                self._changed_rects.append(self._memory_rect)
+                self._mem_rect_version = self.computer.mem_version
 
         """ Draw the operations included in the current instruction """
         if self.draw_ops:
-            self._screen.blit(self.microins_title, (1180, 620))
             if self.computer.op_timestep >= 2:
                 self.op_address_draw = self.computer.inst_reg_a
-            operations = self.computer.assembly[self.op_address_draw].copy()
-            operations.insert(0, self.computer.RO|self.computer.IAI|self.computer.CE)
-            operations.insert(0, self.computer.CO|self.computer.MI)
+            operations = self.computer.assembly_with_prefix[self.op_address_draw]
             for i, operation in enumerate(operations):
                 if (i >= 2 and self.computer.op_timestep < 2):
                     continue
-                s = ""
-                for instruction, label in zip(self.computer.microcodes, self.computer.microcode_labels):
-                    if instruction & operation:
-                        s += f"{label:>8s} | "
-                self.arrow = self._font_small_console_bold.render("> " + "_"*(len(s) - 4), "True", self.DARKKGREEN)
+                self.arrow, out_text = self.render_operation(operation)
                 if i == self.computer.op_timestep:
                     self._screen.blit(self.arrow, (1170, 650 + i*15))
-                out_text = self._font_small_console.render(s[:-2], True, self.TEXTGREY)
                 self._screen.blit(out_text, (1180, 650 + i*15))
 
-        self._text_cycles_ran = self._font.render(f"Clock cycles ran: {self.computer.clockcycles_ran:>10d}", True, self.TEXTGREY)
-
-        uptime = time.time() - self._start_time
-        hours = uptime/3600
-        minutes = (hours - np.floor(hours))*60
-        seconds = (minutes - np.floor(minutes))*60
-
-        hours = int(np.floor(hours))
-        minutes = int(np.floor(minutes))
-        seconds = int(np.floor(seconds))
+        if self.computer.clockcycles_ran != self._cycles_ran_rendered:
+            self._text_cycles_ran = self._font.render(f"Clock cycles ran: {self.computer.clockcycles_ran:>10d}", True, self.TEXTGREY)
+            self._cycles_ran_rendered = self.computer.clockcycles_ran
 
-        self._text_uptime = self._font.render(f"Uptime: {hours:>02d}:{minutes:>02d}:{seconds:>02d}", True, self.TEXTGREY)
+        uptime = int(time.time() - self._start_time)
+        if uptime != self._uptime_rendered:
+            minutes, seconds = divmod(uptime, 60)
+            hours, minutes = divmod(minutes, 60)
+            self._text_uptime = self._font.render(f"Uptime: {hours:>02d}:{minutes:>02d}:{seconds:>02d}", True, self.TEXTGREY)
+            self._uptime_rendered = uptime
 
         self._screen.blit(self.clockrate, (5,5))
         self._screen.blit(self.fpstext, (100,5))
         self._screen.blit(self._text_cycles_ran, (280,5))
-        self._screen.blit(self._loaded_program_text, (280,25))
         self._screen.blit(self._text_uptime, (280,45))
 
-        if self.use_LCD_display: self.LCD_display.render(self._screen)
+        if self.use_LCD_display:
+            if self.LCD_display.render(self._screen):
+                self._changed_rects.append(self.LCD_display.bg_border)
 
-        pygame.display.flip()
+        self.update_display()
 
 
 class Monitor:
@@ -447,13 +532,14 @@ class Monitor:
         self.position = position # top left
         self.font = font
         self.time = time.time()
-        self.cursor_pos = np.zeros(2)
+        self.cursor_x = 0
+        self.cursor_y = 0
         self.cursor_dir = 1
 
         self.lettercolor = (0, 255, 0)
         self.bgcolor = (6, 6, 6)
 
-        self.cursor = self.font.render("_", True, self.lettercolor)
+        self.cursor = convert_surface(self.font.render("_", True, self.lettercolor))
 
         symbol = font.render("0", True, self.lettercolor)
         self.symbolheight = symbol.get_height()
@@ -467,80 +553,151 @@ class Monitor:
         self.bg_border = pygame.Rect(self.position[0] - 5, self.position[1] - 5,
                                      self.pixelsize[0] + 10, self.pixelsize[1] + 10)
 
-        self.memory = np.zeros(columns*rows, dtype = int)
+        """ The border and background never change, so they are drawn once """
+        self._frame = convert_surface(pygame.Surface(self.bg_border.size, pygame.SRCALPHA))
+        pygame.draw.rect(self._frame, (0, 0, 0), self._frame.get_rect(), border_radius = 10)
+        pygame.draw.rect(self._frame, self.bgcolor, self.bg_rect.move(-self.bg_border.left, -self.bg_border.top),
+                         border_radius = 5)
+
+        self.memory = np.zeros(columns*rows, dtype = np.uint8)
+        self.mem_version = 0
+
+        """ The characters are drawn onto a transparent surface, on which only
+        the rows where the memory has changed since the last render are
+        redrawn. _shadow holds the memory as it was drawn, and is only
+        compared against when mem_version has changed.
+        """
+        self._text_surface = convert_surface(pygame.Surface((int(self.pixelsize[0]), int(self.pixelsize[1])),
+                                                            pygame.SRCALPHA))
+        self._shadow = self.memory.copy()
+        self._shadow_version = self.mem_version
+        self._drawn_state = None
+        self._char_cache = {}
+
+        """ Position of every character cell on the text surface """
+        self._cell_pos = [(1 + (self.symbolwidth + 4)*(i%columns),
+                           2 + (self.symbolheight + 4)*(i//columns))
+                          for i in range(columns*rows)]
+
+        """ Every character the memory can hold, rendered up front """
+        self._glyphs = [self.render_character(value) for value in range(256)]
+
+        """ The command for every value of the data lines when writing to the
+        instruction register, decided by the highest bit that is set. The
+        commands for bit 7, 6 and 2 are not implemented.
+        """
+        commands = [(0b10000000, None), (0b01000000, None), (0b00100000, self.next_line),
+                    (0b00010000, self.cursor_control), (0b00001000, self.display_control),
+                    (0b00000100, None), (0b00000010, self.return_home), (0b00000001, self.clear_display)]
+        self._commands = [None]*256
+        for value in range(256):
+            for bit, command in commands:
+                if value&bit:
+                    self._commands[value] = command
+                    break
+
+        """ Cursor movement (x, y) for the lowest four bits of a cursor
+        control command
+        """
+        self._cursor_moves = [((value&1) - ((value >> 1)&1), ((value >> 2)&1) - ((value >> 3)&1))
+                              for value in range(16)]
+
+    def render_character(self, value):
+        """ Returns the rendered character for a value, or None if it can't
+        be drawn. Rendered characters are cached.
+        """
+        value = int(value)
+        if value not in self._char_cache:
+            try:
+                self._char_cache[value] = convert_surface(self.font.render(chr(value), True, self.lettercolor))
+            except (ValueError, pygame.error):
+                self._char_cache[value] = None # null and zero width characters aren't drawn
+        return self._char_cache[value]
 
     def shift_up(self):
-        memsize = self.memory.size
-        self.memory[:memsize - self.columns] = self.memory[self.columns:]
-        self.memory[memsize - self.columns:] = 0
+        """ Shifts the text up one row. The rows already drawn are scrolled up
+        on the text surface as well, so only the new row has to be drawn.
+        """
+        columns = self.columns
+        self.memory[:-columns] = self.memory[columns:]
+        self.memory[-columns:] = 0
+        self.mem_version += 1
+
+        row_height = self.symbolheight + 4
+        self._text_surface.scroll(0, -row_height)
+        self._text_surface.fill((0, 0, 0, 0), (0, (self.rows - 1)*row_height,
+                                               self._text_surface.get_width(), row_height))
+        self._shadow[:-columns] = self._shadow[columns:]
+        self._shadow[-columns:] = 0
 
     def limit_cursor(self):
         # limit cursor to screen bounds
-        if self.cursor_pos[1] >= self.rows:
+        if self.cursor_y >= self.rows:
             # in this case also shift screen up
-            self.cursor_pos[1] = self.rows - 1
+            self.cursor_y = self.rows - 1
             self.shift_up()
 
-        if self.cursor_pos[0] >= self.columns:
-            self.cursor_pos[0] = self.columns - 1
-        if self.cursor_pos[0] < 0:
-            self.cursor_pos[0] = 0
-        if self.cursor_pos[1] < 0:
-            self.cursor_pos[1] = 0
+        if self.cursor_x >= self.columns:
+            self.cursor_x = self.columns - 1
+        if self.cursor_x < 0:
+            self.cursor_x = 0
+        if self.cursor_y < 0:
+            self.cursor_y = 0
 
     def enable_set(self):
         if 0b01000000 & self.control:
             if 0b10000000 & self.control:
                 """ Read """
-                cursor_mem = int(self.cursor_pos[0] + self.cursor_pos[1]*self.columns)
-                self.memory[cursor_mem] = self.data
+                cursor_mem = self.cursor_x + self.cursor_y*self.columns
+                self.memory[cursor_mem] = self.data&0xFF
+                self.mem_version += 1
                 if self.cursor_dir == 1:
-                    self.cursor_pos += (1, 0)
+                    self.cursor_x += 1
                 else:
-                    self.cursor_pos -= (1, 0)
+                    self.cursor_x -= 1
                 self.limit_cursor()
         else:
-            if   0b10000000 & self.data:
-                pass
-            elif 0b01000000 & self.data:
-                pass
-            elif 0b00100000 & self.data:
-                """ Next line, return to start """
-                self.cursor_pos[0] = 0
-                self.cursor_pos[1] += 1
-                if self.cursor_pos[1] >= self.rows:
-                    # in this case also shift screen up
-                    self.cursor_pos[1] = self.rows - 1
-                    self.shift_up()
-            elif 0b00010000 & self.data:
-                """ Cursor control """
-                if 0b00000001 & self.data: # cursor right
-                    self.cursor_pos += (1, 0)
-                if 0b00000010 & self.data: # cursor left
-                    self.cursor_pos -= (1, 0)
-                if 0b00000100 & self.data: # cursor down
-                    self.cursor_pos += (0, 1)
-                if 0b00001000 & self.data: # cursor up
-                    self.cursor_pos -= (0, 1)
-                self.limit_cursor()
+            command = self._commands[self.data&0xFF]
+            if command is not None:
+                command()
+
+    def next_line(self):
+        """ Next line, return to start """
+        self.cursor_x = 0
+        self.cursor_y += 1
+        if self.cursor_y >= self.rows:
+            # in this case also shift screen up
+            self.cursor_y = self.rows - 1
+            self.shift_up()
 
-            elif 0b00001000 & self.data:
-                """ Display on/off control
-                    Always on
-                """
-                self.cursoron = int(bin(self.data)[-2])
-                self.cursorblink = int(bin(self.data)[-1])
-            elif 0b00000100 & self.data:
-                pass
-            elif 0b00000010 & self.data:
-                """ Return home """
-                self.cursor_pos = np.zeros(2)
-                self.shift = 0
-            elif 0b00000001 & self.data:
-                """ Clear display """
-
-                self.memory[:] = 0
-                self.cursor_pos = np.zeros(2)
+    def cursor_control(self):
+        """ Cursor control. The lowest four bits move the cursor right, left,
+        down and up.
+        """
+        dx, dy = self._cursor_moves[self.data&0b1111]
+        self.cursor_x += dx
+        self.cursor_y += dy
+        self.limit_cursor()
+
+    def display_control(self):
+        """ Display on/off control
+            Always on
+        """
+        self.cursoron = (self.data >> 1)&1
+        self.cursorblink = self.data&1
+
+    def return_home(self):
+        """ Return home """
+        self.cursor_x = 0
+        self.cursor_y = 0
+        self.shift = 0
+
+    def clear_display(self):
+        """ Clear display """
+        self.memory[:] = 0
+        self.mem_version += 1
+        self.cursor_x = 0
+        self.cursor_y = 0
 
     def set_data_lines(self, value):
         self.data = int(value)
@@ -558,36 +715,49 @@ class Monitor:
             self.previous_enable = False
                 
     def render(self, screen):
-        pygame.draw.rect(screen, (0, 0, 0), self.bg_border, border_radius = 10)
-        pygame.draw.rect(screen, self.bgcolor, self.bg_rect, border_radius = 5)
+        """ Draws the monitor. Returns True if it looks different from the
+        last time it was drawn.
+        """
+        screen.blit(self._frame, self.bg_border)
 
         cursor = self.cursor
 
-        if time.time() - self.time > 0.5:
-            if self.cursordraw:
-                self.cursordraw = False
-            else:
-                self.cursordraw = True
-            self.time = time.time()
-
-        for i, val in enumerate(self.memory):
-            col = i%self.columns
-            row = i//self.columns
+        now = time.time()
+        if now - self.time > 0.5:
+            self.cursordraw = not self.cursordraw
+            self.time = now
+
+        if self.mem_version != self._shadow_version:
+            row_height = self.symbolheight + 4
+            changed = (self.memory != self._shadow).reshape(self.rows, self.columns)
+            for row in np.flatnonzero(changed.any(axis = 1)):
+                self._text_surface.fill((0, 0, 0, 0), (0, row*row_height, self._text_surface.get_width(), row_height))
+                cells = slice(row*self.columns, (row + 1)*self.columns)
+                texts = [self._glyphs[value] for value in self.memory[cells].tolist()]
+                self._text_surface.blits([(text, pos) for text, pos in zip(texts, self._cell_pos[cells])
+                                          if text is not None],
+                                         doreturn = False)
+            self._shadow[:] = self.memory
+            self._shadow_version = self.mem_version
+
+        screen.blit(self._text_surface, self.position)
+
+        cursor_cell = None
+        if self.cursordraw and self.cursoron:
+            col = self.cursor_x
+            row = self.cursor_y
+            if 0 <= col < self.columns and 0 <= row < self.rows:
+                cell = col + row*self.columns
+                x, y = self._cell_pos[cell]
+                screen.blit(cursor, (x + self.position[0], y + self.position[1]))
+                cursor_cell = cell
+
+        state = (self._shadow_version, cursor_cell)
+        changed = state != self._drawn_state
+        self._drawn_state = state
+        return changed
 
-            x = 1 + (self.symbolwidth + 4)*col + self.position[0]
-            y = 2 + (self.symbolheight + 4)*row + self.position[1]
-            character = chr(val)
-            try:
-                text = self.font.render(character, True, self.lettercolor)
-                screen.blit(text, (x, y))
-            except ValueError as e:
-                pass # null characters aren't drawn
-                
-            if self.cursordraw and self.cursoron:
-                if col == self.cursor_pos[0] and row == self.cursor_pos[1]:
-                    screen.blit(cursor, (x, y))
 
-            
 
 
 if __name__ == "__main__":
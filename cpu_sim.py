@@ -1,6 +1,7 @@
 import time
 import os
 import sys
+import functools
 
 import pygame
 from pygame.locals import *
@@ -8,6 +9,140 @@ from pygame import gfxdraw
 import numpy as np
 
 
+FONT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "font")
+HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype = np.uint8)
+
+
+def byte_view(array):
+    """ Returns a uint8 view of an integer array with one row per element,
+    where each row holds the bytes of the element with the most significant
+    byte first.
+    """
+    view = array.view(np.uint8).reshape(-1, array.itemsize)
+    if np.little_endian:
+        view = view[:, ::-1]
+    return view
+
+
+class PagedMemory:
+    """ Memory for a large address space, which is allocated in pages of
+    PAGE_SIZE words when they are first written to. Reading a word from a
+    page that has not been written to gives 0.
+
+    Can be indexed like a numpy array with single addresses, or with slices
+    with a step of 1. The first page is always allocated, and is available
+    as first_page so the start of the memory can be viewed as an array.
+    """
+    PAGE_BITS = 12
+    PAGE_SIZE = 2**PAGE_BITS
+
+    def __init__(self, bits, dtype = np.uint32):
+        """ Arguments:
+        bits        -   number of address bits, the memory holds 2**bits words
+        dtype       -   numpy data type of the words
+        """
+        self.size = 2**bits
+        self.dtype = np.dtype(dtype)
+        self._zero = self.dtype.type(0)
+        self._offset_mask = self.PAGE_SIZE - 1
+        self.first_page = np.zeros(self.PAGE_SIZE, dtype = self.dtype)
+        self._pages = {0: self.first_page}
+
+        """ The last page accessed, which saves the page lookup when the
+        following accesses are on the same page
+        """
+        self._last_page_number = 0
+        self._last_page = self.first_page
+
+    def __len__(self):
+        return self.size
+
+    def _page(self, page_number, allocate = False):
+        """ Returns a page, or None if it has not been allocated and allocate
+        is False.
+        """
+        if page_number == self._last_page_number:
+            return self._last_page
+        page = self._pages.get(page_number)
+        if page is None:
+            if not allocate:
+                return None
+            page = np.zeros(self.PAGE_SIZE, dtype = self.dtype)
+            self._pages[page_number] = page
+        self._last_page_number = page_number
+        self._last_page = page
+        return page
+
+    def _segments(self, index):
+        """ Splits a slice into (page number, offset, start, stop) for every
+        page it covers, where start and stop are relative to the slice start.
+        """
+        start, stop, step = index.indices(self.size)
+        if step != 1:
+            raise IndexError("PagedMemory only supports slices with a step of 1")
+        address = start
+        while address < stop:
+            page_number = address >> self.PAGE_BITS
+            offset = address & self._offset_mask
+            end = min(stop, (page_number + 1) << self.PAGE_BITS)
+            yield page_number, offset, address - start, end - start
+            address = end
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.size)
+            words = np.zeros(max(0, stop - start), dtype = self.dtype)
+            for page_number, offset, first, last in self._segments(index):
+                page = self._page(page_number)
+                if page is not None:
+                    words[first:last] = page[offset:offset + last - first]
+            return words
+
+        address = int(index)
+        if address < 0:
+            address += self.size
+        page = self._page(address >> self.PAGE_BITS)
+        if page is None:
+            return self._zero
+        return page[address & self._offset_mask]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            values = np.asarray(value)
+            for page_number, offset, first, last in self._segments(index):
+                page = self._page(page_number, allocate = True)
+                if values.ndim == 0:
+                    page[offset:offset + last - first] = values
+                else:
+                    page[offset:offset + last - first] = values[first:last]
+            return
+
+        address = int(index)
+        if address < 0:
+            address += self.size
+        page = self._page(address >> self.PAGE_BITS, allocate = True)
+        page[address & self._offset_mask] = value
+
+
+def convert_surface(surface):
+    """ Converts a surface with per pixel alpha to the pixel format of the
+    display, so that it can be blitted without converting every pixel. The
+    surface is returned unchanged if no display mode has been set.
+    """
+    if pygame.display.get_surface() is None:
+        return surface
+    return surface.convert_alpha()
+
+
+@functools.lru_cache(maxsize = 4096)
+def render_cached(font, text, color):
+    """ Renders antialiased text with a font, caching the result so that
+    strings which are drawn every frame are only rasterized once. The returned
+    surface is shared between calls and must not be modified.
+    """
+    return convert_surface(font.render(text, True, color))
+
+
 def draw_circle(surface, x, y, radius, color, bordercolor = None):
     x = int(x)
     y = int(y)
@@ -18,12 +153,38 @@ def draw_circle(surface, x, y, radius, color, bordercolor = None):
 
 
 class Computer:
+    """ The attributes are fixed, so they are kept in slots instead of an
+    instance dictionary, which makes them faster to access in the clock loop.
+    """
+    __slots__ = ("memory", "memory_bytes", "mem_version", "mem_strings",
+                 "overflow_limit", "stackpointer_start", "bits_stackpointer",
+                 "stack_mask", "program",
+                 # control signals
+                 "HLT", "MI", "RI", "RO", "IAO", "IAI", "IBO", "IBI", "AI",
+                 "AO", "EO", "SU", "BI", "OI", "CE", "CO", "JMP", "FI", "JC",
+                 "JZ", "KEO", "ORE", "INS", "DES", "STO", "RSA", "LSA", "DDI",
+                 "DCI",
+                 # microcode and instructions
+                 "microcodes", "microcode_labels", "assembly", "instruction_map",
+                 "control_rom", "assembly_with_prefix", "_bus_sources",
+                 "_clock_actions", "_dispatch",
+                 # registers and state
+                 "bus", "areg", "breg", "sumreg", "flagreg", "flags",
+                 "memaddress", "memcontent", "inst_reg_a", "inst_reg_b",
+                 "out_regist", "prog_count", "input_regi", "op_timestep",
+                 "controlword", "halting", "carry", "zero", "stackpointer",
+                 "timer_indicator", "clockcycles_ran", "screen_data",
+                 "screen_control")
+
     def __init__(self, progload):
-        self.memory = np.zeros(256, dtype = np.uint16)
+        self.memory = np.zeros(256, dtype = np.uint8) # 8 bit words
+        self.memory_bytes = byte_view(self.memory)
+        self.mem_version = 0
         self.get_mem_strings()
         self.overflow_limit = 256
         self.stackpointer_start = 224
         self.bits_stackpointer = 4
+        self.stack_mask = 2**self.bits_stackpointer - 1
 
         print(f"Stack range: {hex(self.stackpointer_start)} : {hex(self.stackpointer_start+ 2**self.bits_stackpointer)}")
         print(f"Stack size: {2**self.bits_stackpointer}")
@@ -143,6 +304,53 @@ class Computer:
                                 "OUT": 254,
                                 "HLT": 255,}
 
+        """ Control ROM with the control word for every instruction and
+        operation timestep, including the two steps every instruction begins
+        with.
+        """
+        self.control_rom = np.zeros((len(self.assembly), 8), dtype = np.uint64)
+        self.control_rom[:, 0] = MI|CO
+        self.control_rom[:, 1] = RO|IAI|CE
+        for instruction, operations in self.assembly.items():
+            self.control_rom[instruction, 2:2 + len(operations)] = operations
+
+        """ What every control word in the control ROM does, decoded once so
+        that the control signals don't have to be tested one by one on every
+        clock pulse. See route_control_word.
+        """
+        self._bus_sources = {}
+        self._clock_actions = {}
+        for operation in set(self.control_rom.ravel().tolist()):
+            bus_source, actions = self.route_control_word(operation)
+            self._bus_sources[operation] = bus_source
+            self._clock_actions[operation] = actions
+
+        """ The control word and bus source for every instruction and
+        operation timestep, so that update gets both with one lookup
+        """
+        self._dispatch = [[(operation, self._bus_sources[operation]) for operation in row]
+                          for row in self.control_rom.tolist()]
+
+        """ The operations of every instruction, including the two steps
+        every instruction begins with, for listing them in the GUI.
+        """
+        self.assembly_with_prefix = {instruction: [MI|CO, RO|IAI|CE] + operations
+                                     for instruction, operations in self.assembly.items()}
+
+    def check_word(self, value, line_number, line):
+        """ Raises a ValueError if a value from the program file doesn't fit
+        in a memory word.
+
+        Arguments:
+        value       -   value to be stored in memory, int
+        line_number -   line of the program file the value comes from, int
+        line        -   text of that line, string
+        """
+        if not 0 <= value < self.overflow_limit:
+            print(f"Assembler error on line {line_number}: {line.strip()}")
+            raise ValueError(f"Value {value} on line {line_number} doesn't fit in a "
+                             f"memory word (0 to {self.overflow_limit - 1})")
+
     def assembler(self, progload):
         """ Assembles a program file into values in memory for the computer to
         run. See assembler docs for more info.
@@ -167,6 +375,7 @@ class Computer:
         addresses_line = {}
         variables = {}
         program = []
+        program_lines = [] # source line of each program entry, for errors
 
         address = 0
         progline = 0
@@ -183,6 +392,7 @@ class Computer:
                     instruction = instruction[:2]
 
                 program.append([instruction, address - progline])
+                program_lines.append((i + 1, line))
                 print(len(s)*" ", end = "\r")
                 s = f"{instruction[0]} in address {address}"
                 print(s, end = "\r")
@@ -224,15 +434,17 @@ class Computer:
                                     val -= int(t2)
                         memaddress = val
 
-                        if '"' in value:
-                            val_string = value.split('"')[1]
-                            for i, item in enumerate(val_string):
-                                self.memory[memaddress + i] = ord(item)
-                        elif "'" in value:
-                            val_string = value.split("'")[1]
-                            for i, item in enumerate(val_string):
-                                self.memory[memaddress + i] = ord(item)
+                        if '"' in value or "'" in value:
+                            """ String, stored with a single slice assignment """
+                            quote = '"' if '"' in value else "'"
+                            val_string = value.split(quote)[1]
+                            codes = [ord(item) for item in val_string]
+                            for code in codes:
+                                self.check_word(code, i + 1, line)
+                            end = memaddress + len(codes)
+                            self.memory[memaddress:end] = codes
                         else:
+                            self.check_word(int(value), i + 1, line)
                             self.memory[memaddress] = int(value)
                     else:
                         """ Pointer variable """
@@ -259,6 +471,7 @@ class Computer:
         print("Second pass...")
         print("[" + " "*50 + "]", end = "\r")
         memaddress = 0
+        program_words = []
         for i, line in enumerate(program):
             jump = False
             items = line[0]
@@ -296,11 +509,14 @@ class Computer:
                                     val -= int(t2)
                         program[i][0][1] = str(val)
                         mem_ins = int(val)
-                self.memory[memaddress] = mem_ins
+                    self.check_word(mem_ins, *program_lines[i])
+                program_words.append(mem_ins)
                 memaddress += 1
             half_pct = min(int((i + 1)/len(program)*50), 50)
             print("[" + "#"*half_pct + " "*(50 - half_pct) + "]", end = "\r")
+        self.memory[:len(program_words)] = program_words
         print("\nProgram assembled.")
+        self.mem_version += 1
 
         print(f"{memaddress} bytes of memory used for program.")
         self.program = program
@@ -312,20 +528,33 @@ class Computer:
         Each element of the list is a string containing the first 16 bytes of
         memory.
 
+        The hex formatting is done for all the memory words at once with numpy,
+        by splitting the bytes of memory_bytes into nibbles and looking each
+        nibble up in a table of hex digits.
+
         Returns:
         mem_strings -   list containing memory strings
         """
+        words = self.memory[:rows*rowlength]
+        n = len(words)
+        width = textlength
+        if n > 0:
+            width = max(textlength, (int(words.max()).bit_length() + 3)//4)
+
+        membytes = self.memory_bytes[:n]
+        nibbles = np.stack((membytes >> 4, membytes & 0xf), axis = -1).reshape(n, -1)
+        digits = min(width, nibbles.shape[1])
+        cells = np.full((n, width + 1), ord(" "), dtype = np.uint8)
+        cells[:, :width - digits] = ord("0")
+        cells[:, width - digits:width] = HEX_DIGITS[nibbles[:, nibbles.shape[1] - digits:]]
+
         mem_strings = []
         for i in range(rows):
-            line = self.memory[i*rowlength:i*rowlength + rowlength]
-            s = ""
-            for j, item in enumerate(line):
-                item = hex(item).replace("0x", "")
-                while len(item) < textlength:
-                    item = "0" + item
-                s += f"{item} "
-                if j == 7 and space:
-                    s += " "
+            line = cells[i*rowlength:i*rowlength + rowlength]
+            s = line.tobytes().decode("ascii")
+            if space and len(line) > 7:
+                split = 8*(width + 1)
+                s = s[:split] + " " + s[split:]
 
             mem_strings.append(s)
         self.mem_strings = mem_strings
@@ -358,40 +587,86 @@ class Computer:
         self.screen_control = 0
 
         self.memaddress = self.bus
-        self.memcontent = self.memory[self.memaddress]
+        self.memcontent = int(self.memory[self.memaddress])
 
     def update_ALU(self):
         """ Updates the value stored in the ALU based on the current values in
         the A and B registers, and the subtract control signal.
         """
-        self.carry = 0
-        self.zero = 0
-        a = int(self.areg)
-        b = int(self.breg)
+        a = self.areg
+        b = self.breg
 
         maximum = self.overflow_limit
 
         if self.controlword&self.SU:
-            self.sumreg = a + (maximum - b) # two's complement subtraction
-                                            # in order to set carry flag
-                                            # for subtractions where a >= b
+            result = a + (maximum - b) # two's complement subtraction
+                                       # in order to set carry flag
+                                       # for subtractions where a >= b
+        else:
+            result = a + b
+
+        """ The sum wraps around to the range of the register, and the carry
+        flag is set if it had to be wrapped
+        """
+        if 0 <= result < maximum:
+            sumreg = result
+            carry = 0
         else:
-            self.sumreg = a + b
-
-        while self.sumreg >= maximum:
-            self.sumreg -= maximum
-            self.carry = 1
-        while self.sumreg < 0:
-            self.sumreg += maximum
-            self.carry = 1
-        if self.sumreg == 0:
-            self.zero = 1
-
-        self.flags = 0b0
-        if self.carry:
-            self.flags = self.flags|0b10
-        if self.zero:
-            self.flags = self.flags|0b01
+            sumreg = result % maximum
+            carry = 1
+        zero = 1 if sumreg == 0 else 0
+
+        self.sumreg = sumreg
+        self.carry = carry
+        self.zero = zero
+        self.flags = carry << 1 | zero
+
+    def route_control_word(self, operation):
+        """ Decodes a control word into what it does to the registers.
+
+        Arguments:
+        operation   -   The control word.
+
+        Returns:
+        bus_source  -   Function returning the value put on the bus, or None
+                        if nothing is put on the bus. If several out signals
+                        are set, the last one of IAO, IBO, RO, AO, KEO, EO,
+                        CO and STO wins.
+        actions     -   Tuple with the functions to call on the clock high
+                        pulse, in the order the signals are handled.
+        """
+        bus_sources = ((self.IAO, lambda: self.inst_reg_a),
+                       (self.IBO, lambda: self.inst_reg_b),
+                       (self.RO,  lambda: self.memcontent),
+                       (self.AO,  lambda: self.areg),
+                       (self.KEO, lambda: self.input_regi),
+                       (self.EO,  lambda: self.sumreg),
+                       (self.CO,  lambda: self.prog_count),
+                       (self.STO, lambda: self.stackpointer + self.stackpointer_start))
+        signal_actions = ((self.FI,  self.flags_in),
+                          (self.MI,  self.memory_address_in),
+                          (self.RI,  self.ram_in),
+                          (self.IAI, self.instruction_a_in),
+                          (self.IBI, self.instruction_b_in),
+                          (self.AI,  self.a_in),
+                          (self.RSA, self.shift_a_right),
+                          (self.BI,  self.b_in),
+                          (self.OI,  self.output_in),
+                          (self.CE,  self.counter_enable),
+                          (self.DDI, self.display_data_in),
+                          (self.DCI, self.display_control_in),
+                          (self.JMP, self.jump),
+                          (self.JC,  self.jump_on_carry),
+                          (self.JZ,  self.jump_on_zero),
+                          (self.INS, self.increment_stack),
+                          (self.DES, self.decrement_stack))
+
+        bus_source = None
+        for signal, source in bus_sources:
+            if operation&signal:
+                bus_source = source
+        actions = tuple(action for signal, action in signal_actions if operation&signal)
+        return bus_source, actions
 
     def update(self):
         """ Updates the value on the appropriate registers and bus.
@@ -402,44 +677,13 @@ class Computer:
 
         # get the appropriate control word based on the current instruction
         # and operation timestep
-        if self.op_timestep == 0:
-            operation = self.MI|self.CO
-        elif self.op_timestep == 1:
-            operation = self.RO|self.IAI|self.CE
-        else:
-            operation_ID = self.inst_reg_a
-            operations = self.assembly[operation_ID]
-            if self.op_timestep - 2 >= len(operations):
-                operation = 0
-            else:
-                operation = operations[self.op_timestep - 2]
+        operation, bus_source = self._dispatch[self.inst_reg_a][self.op_timestep]
         self.controlword = operation
 
-        if operation&self.IAO:
-            self.bus = self.inst_reg_a
-
-        if operation&self.IBO:
-            self.bus = self.inst_reg_b
-
-        if operation&self.RO:
-            self.bus = self.memcontent
-
-        if operation&self.AO:
-            self.bus = self.areg
-        
         self.update_ALU()
 
-        if operation&self.KEO:
-            self.bus = self.input_regi
-
-        if operation&self.EO:
-            self.bus = self.sumreg
-
-        if operation&self.CO:
-            self.bus = self.prog_count
-
-        if operation&self.STO:
-            self.bus = self.stackpointer + self.stackpointer_start
+        if bus_source is not None:
+            self.bus = bus_source()
 
     def clock_high(self):
         """ Updates states that should update on clock-high pulse """
@@ -455,66 +699,67 @@ class Computer:
         else:
             self.halting = 0
 
-        if operation&self.FI:
-            self.flagreg = self.flags
+        for action in self._clock_actions[operation]:
+            action()
 
-        if operation&self.MI:
-            self.memaddress = self.bus
-            self.memcontent = self.memory[int(self.memaddress)]
+        return True
 
-        if operation&self.RI:
-            self.memcontent = self.bus
-            self.memory[self.memaddress] = self.memcontent
+    # actions for the control signals handled on the clock high pulse
+    def flags_in(self):
+        self.flagreg = self.flags
 
-        if operation&self.IAI:
-            self.inst_reg_a = self.bus
+    def memory_address_in(self):
+        self.memaddress = self.bus
+        self.memcontent = int(self.memory[int(self.memaddress)])
 
-        if operation&self.IBI:
-            self.inst_reg_b = self.bus
+    def ram_in(self):
+        self.memcontent = self.bus
+        self.memory[self.memaddress] = self.memcontent
+        self.mem_version += 1
 
-        if operation&self.AI:
-            self.areg = self.bus
+    def instruction_a_in(self):
+        self.inst_reg_a = self.bus
 
-        if operation&self.RSA:
-            self.areg = self.areg // 2
+    def instruction_b_in(self):
+        self.inst_reg_b = self.bus
 
-        if operation&self.BI:
-            self.breg = self.bus
+    def a_in(self):
+        self.areg = self.bus
 
-        if operation&self.OI:
-            self.out_regist = self.bus
+    def shift_a_right(self):
+        self.areg = self.areg // 2
 
-        if operation&self.CE:
-            self.prog_count += 1
+    def b_in(self):
+        self.breg = self.bus
 
-        if operation&self.DDI:
-            self.screen_data = self.bus
+    def output_in(self):
+        self.out_regist = self.bus
 
-        if operation&self.DCI:
-            self.screen_control = self.bus//(2**5)
+    def counter_enable(self):
+        self.prog_count += 1
 
-        if operation&self.JMP:
-            self.prog_count = self.bus
+    def display_data_in(self):
+        self.screen_data = self.bus
 
-        if operation&self.JC:
-            if self.flagreg&0b10:
-                self.prog_count = self.bus
+    def display_control_in(self):
+        self.screen_control = self.bus//(2**5)
 
-        if operation&self.JZ:
-            if self.flagreg&0b01:
-                self.prog_count = self.bus
+    def jump(self):
+        self.prog_count = self.bus
 
-        if operation&self.INS:
-            self.stackpointer += 1
-            if self.stackpointer >= 2**self.bits_stackpointer:
-                self.stackpointer = 0
+    def jump_on_carry(self):
+        if self.flagreg&0b10:
+            self.prog_count = self.bus
 
-        if operation&self.DES:
-            self.stackpointer -= 1
-            if self.stackpointer < 0:
-                self.stackpointer = 2**self.bits_stackpointer - 1
+    def jump_on_zero(self):
+        if self.flagreg&0b01:
+            self.prog_count = self.bus
 
-        return True
+    def increment_stack(self):
+        self.stackpointer = (self.stackpointer + 1)&self.stack_mask
+
+    def decrement_stack(self):
+        self.stackpointer = (self.stackpointer - 1)&self.stack_mask
 
     def clock_low(self):
         """ Updates states that should update on clock-low pulse """
@@ -538,9 +783,44 @@ class Computer:
 
         return result
 
+    def run_cycles(self, cycles, on_clock = None):
+        """ Runs a number of clock cycles in one call, doing the same as the
+        game loop does for every cycle (update, clock high, update, clock
+        low). The methods are looked up once, outside of the loop. Stops
+        early if the computer halts, as the remaining cycles would not change
+        anything.
+
+        Arguments:
+        cycles      -   The number of clock cycles to run.
+        on_clock    -   Function to call after the update following the clock
+                        high pulse, e.g. to update the LCD display. Optional.
+        """
+        update = self.update
+        clock_high = self.clock_high
+        clock_low = self.clock_low
+        for i in range(cycles):
+            update()
+            clock_high()
+            update()
+            if on_clock is not None:
+                on_clock()
+            clock_low()
+            if self.halting:
+                break
+
 
 class BitDisplay:
     """ Class for making LED displays """
+    __slots__ = ("length", "text", "_x", "_y", "oncolor", "offcolor", "radius",
+                 "_separation", "_width", "_cpos", "reg_bg", "text_rendered",
+                 "_xs", "_ys", "xvalues", "_state_mask", "_static_painted",
+                 "_lit_surf", "_lit_cells")
+
+    # attributes saved when pickling a display, the rest are computed from
+    # these when it is loaded and the prerendered surfaces can't be pickled
+    _pickled = ("length", "text", "_x", "_y", "oncolor", "offcolor", "radius",
+                "_separation", "_width", "_cpos", "reg_bg", "text_rendered")
+
     def __init__(self, oncolor = (0, 255, 0), offcolor = (0, 50, 0),
                  cpos = (0,0), length = 8, text = "Display",
                  font = None, textcolor = (255, 255, 255),
@@ -596,10 +876,28 @@ class BitDisplay:
                                   int(self._width + 10), int(self.radius*2 + 10))
         
         if not font is None:
-            self.text_rendered = font.render(self.text, True, textcolor)
+            self.text_rendered = convert_surface(font.render(self.text, True, textcolor))
         else:
             self.text_rendered = None
 
+        self._state_mask = np.zeros(self.length, dtype = bool)
+        self._static_painted = False
+        self._lit_surf = None
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self._pickled}
+
+    def __setstate__(self, state):
+        """ Restores a pickled display, e.g. from a save in learn_cpu, and
+        recomputes the LED positions and state.
+        """
+        self.text_rendered = None
+        for name, value in state.items():
+            if name in self._pickled:
+                setattr(self, name, value)
+        self.cpos = self._cpos
+        self._state_mask = np.zeros(self.length, dtype = bool)
+
     @property
     def x(self):
         return self._x
@@ -622,6 +920,53 @@ class BitDisplay:
                                   int(self._y - self.radius - 5),
                                   int(self._width + 10), int(self.radius*2 + 10))
 
+        """ LED center coordinates """
+        x0 = int(self._x - self._width/2 + self.radius)
+        step = self.radius*2 + self._separation
+        self._xs = x0 + step*np.arange(self.length, dtype = np.int32)
+        self._ys = np.full(self.length, int(self._y), dtype = np.int32)
+        self.xvalues = self._xs.tolist()
+        self._static_painted = False
+        self._lit_surf = None
+
+    def draw_static(self, surface):
+        """ Draws the title text and all the LED's in their off state. They
+        are drawn straight onto the destination, as the anti-aliased edges of
+        the LED's only blend correctly with an opaque background.
+        """
+        for x, y in zip(self.xvalues, self._ys.tolist()):
+            draw_circle(surface, x, y, self.radius, self.offcolor)
+
+        if self.text_rendered is not None:
+            textwidth = self.text_rendered.get_width()
+            textheight = self.text_rendered.get_height()
+            text_x = int(self._x - textwidth/2)
+            text_y = int((self._y - textheight/2 - self.radius - 20))
+            surface.blit(self.text_rendered, (text_x, text_y))
+
+    def paint_static(self, surface):
+        """ Paints the title and the LED's in their off state onto a
+        background surface. After this only the LED's that are on are drawn
+        by the draw methods, so the background must be restored under the
+        display before every draw.
+
+        A copy of the background with every LED on is also made, from which
+        the LED's that are on are blitted instead of drawn.
+        """
+        self.draw_static(surface)
+        self._static_painted = True
+
+        led_rect = self.led_rect
+        self._lit_surf = pygame.Surface(led_rect.size, 0, surface)
+        self._lit_surf.blit(surface, (0, 0), led_rect)
+        size = 2*self.radius + 1
+        self._lit_cells = []
+        for x, y in zip(self.xvalues, self._ys.tolist()):
+            draw_circle(self._lit_surf, x - led_rect.left, y - led_rect.top, self.radius, self.oncolor)
+            self._lit_cells.append(((x - self.radius, y - self.radius),
+                                    pygame.Rect(x - self.radius - led_rect.left,
+                                                y - self.radius - led_rect.top, size, size)))
+
     def draw_bits(self, int_in, screen):
         """ Draws the LED's with the bits on corresponding to the 1's in an
         integer. I.e. if the integer passed is 10000001, the first and last
@@ -633,7 +978,6 @@ class BitDisplay:
         int_in      -   The integer determining which LED's are on.
         screen      -   The Pygame surface to draw to.
         """
-        self.xvalues = []
         bitstring = f"{int_in:d}"
         self.draw_bitstring(bitstring, screen)
 
@@ -644,29 +988,37 @@ class BitDisplay:
         
         Also draws the title if self.text_rendered is not None.
 
+        Once the title and the LED's in their off state are painted onto the
+        background, only the LED's that are on are drawn.
         """
         while len(bitstring) < self.length:
             bitstring = "0" + bitstring
         bitstring = bitstring[-self.length:]
-        
-        y = int(self._y)
-        x = int(self._x - self._width/2 + self.radius)
 
-        for bit_value in bitstring:
-            if bit_value == "1":
-                color = self.oncolor
-            else:
-                color = self.offcolor
-            draw_circle(screen, x, y, self.radius, color)
-            self.xvalues.append(x)
-            x += self.radius*2 + self._separation
+        self._state_mask = np.frombuffer(bitstring.encode(), dtype = np.uint8) == ord("1")
+        self.draw_state(screen)
 
-        if self.text_rendered is not None:
-            textwidth = self.text_rendered.get_width()
-            textheight = self.text_rendered.get_height()
-            text_x = int(self._x - textwidth/2)
-            text_y = int((self._y - textheight/2 - self.radius - 20))
-            screen.blit(self.text_rendered, (text_x, text_y))
+    def set_value(self, value):
+        """ Sets which LED's are on from the lowest self.length bits of an
+        integer, unpacking all the bits at once with numpy.
+        """
+        value = int(value) & ((1 << self.length) - 1)
+        value_bytes = value.to_bytes((self.length + 7)//8, "big")
+        bits = np.unpackbits(np.frombuffer(value_bytes, dtype = np.uint8))
+        self._state_mask = bits[-self.length:].astype(bool)
+
+    def draw_state(self, screen):
+        """ Draws the display with the LED's in self._state_mask on """
+        if not self._static_painted:
+            self.draw_static(screen)
+
+        if self._lit_surf is not None:
+            screen.blits([(self._lit_surf,) + self._lit_cells[idx] for idx in np.flatnonzero(self._state_mask)],
+                         doreturn = False)
+            return
+
+        for idx in np.flatnonzero(self._state_mask):
+            draw_circle(screen, self._xs[idx], self._ys[idx], self.radius, self.oncolor)
 
     def draw_number(self, num_in, screen):
         """ Draws the LED screen with the bits on corresponding to a decimal
@@ -679,13 +1031,31 @@ class BitDisplay:
         """
         if num_in is None:
             num_in = 0
-        bin_out = int(bin(int(num_in)).replace("0b", ""))
-        self.draw_bits(bin_out, screen)
+        self.set_value(num_in)
+        self.draw_state(screen)
 
     @property
     def width(self):
         return self._width
 
+    @property
+    def led_rect(self):
+        """ Rectangle covering exactly the LED's """
+        return pygame.Rect(int(self._xs[0]) - self.radius, int(self._ys[0]) - self.radius,
+                           int(self._xs[-1] - self._xs[0]) + 2*self.radius + 1, 2*self.radius + 1)
+
+    @property
+    def rect(self):
+        """ Rectangle covering the LED's and the title text """
+        rect = self.reg_bg.copy()
+        if self.text_rendered is not None:
+            textwidth = self.text_rendered.get_width()
+            textheight = self.text_rendered.get_height()
+            rect.union_ip(pygame.Rect(int(self._x - textwidth/2),
+                                      int(self._y - textheight/2 - self.radius - 20),
+                                      textwidth, textheight))
+        return rect
+
 
 class Game:
     """ Main control class. Handles rendering, timing control and user input. """
@@ -715,6 +1085,11 @@ class Game:
         self.draw_mem = draw_mem
         self.draw_ops = draw_ops
         self.op_address_draw = 0
+        self._mem_strings_version = None
+        self._cycles_ran_rendered = None
+        self._uptime_rendered = None
+        self._out_regist_rendered = None
+        self._microop_render_cache = {}
 
         self.WHITE = (255, 255, 255)
         self.TEXTGREY = (180, 180, 180)
@@ -738,10 +1113,10 @@ class Game:
 
     def setup_fonts(self):
         pygame.font.init()
-        self._font_exobold = pygame.font.Font(os.path.join(os.getcwd(), "font", "ExoBold-qxl5.otf"), 19)
-        self._font_exobold_small = pygame.font.Font(os.path.join(os.getcwd(), "font", "ExoBold-qxl5.otf"), 13)
-        self._font_brush = pygame.font.Font(os.path.join(os.getcwd(), "font", "BrushSpidol.otf"), 25)
-        self._font_segmentdisplay = pygame.font.Font(os.path.join(os.getcwd(), "font", "28segment.ttf"), 80)
+        self._font_exobold = pygame.font.Font(os.path.join(FONT_DIR, "ExoBold-qxl5.otf"), 19)
+        self._font_exobold_small = pygame.font.Font(os.path.join(FONT_DIR, "ExoBold-qxl5.otf"), 13)
+        self._font_brush = pygame.font.Font(os.path.join(FONT_DIR, "BrushSpidol.otf"), 25)
+        self._font_segmentdisplay = pygame.font.Font(os.path.join(FONT_DIR, "28segment.ttf"), 80)
         self._font_console_bold = pygame.font.SysFont("monospace", 17, bold = True)
         self._font_small_console = pygame.font.SysFont("monospace", 11)
         self._font_small_console_bold = pygame.font.SysFont("monospace", 11, bold = True, italic = True)
@@ -749,11 +1124,11 @@ class Game:
         self._font_verysmall_console_bold = pygame.font.SysFont("monospace", 10, bold = True)
         self._font_veryverysmall_console = pygame.font.SysFont("monospace", 9)
         self._font_veryverysmall_console_bold = pygame.font.SysFont("monospace", 9, bold = True)
-        self._font_small = pygame.font.Font(os.path.join(os.getcwd(), "font", "Amble-Bold.ttf"), 11)
-        self._font = pygame.font.Font(os.path.join(os.getcwd(), "font", "Amble-Bold.ttf"), 16)
-        self._font_large = pygame.font.Font(os.path.join(os.getcwd(), "font", "Amble-Bold.ttf"), 25)
-        self._font_larger = pygame.font.Font(os.path.join(os.getcwd(), "font", "Amble-Bold.ttf"), 45)
-        self._font_verylarge = pygame.font.Font(os.path.join(os.getcwd(), "font", "Amble-Bold.ttf"), 64)
+        self._font_small = pygame.font.Font(os.path.join(FONT_DIR, "Amble-Bold.ttf"), 11)
+        self._font = pygame.font.Font(os.path.join(FONT_DIR, "Amble-Bold.ttf"), 16)
+        self._font_large = pygame.font.Font(os.path.join(FONT_DIR, "Amble-Bold.ttf"), 25)
+        self._font_larger = pygame.font.Font(os.path.join(FONT_DIR, "Amble-Bold.ttf"), 45)
+        self._font_verylarge = pygame.font.Font(os.path.join(FONT_DIR, "Amble-Bold.ttf"), 64)
 
     def make_static_graphics(self):
         # Draw line connections
@@ -843,7 +1218,7 @@ class Game:
 
         self.keypad_rows = [self.keypad1, self.keypad2, self.keypad3, self.keypad4]
         self.keypad_numbers = [0, 0, 0, 0]
-        self.keypad = np.zeros((4,3))
+        self.keypad = [0]*12 # pressed state of the keypad buttons, row by row
         self.keypad_zero_pressed = 0
         self.keypad_div_pressed = 0
 
@@ -856,6 +1231,18 @@ class Game:
         self.keypad_texts_0 = self._font_small.render("0", True, self.WHITE)
         self.keypad_texts_div = self._font_small.render("/", True, self.WHITE)
 
+        """ Centers of the keypad buttons, and the label positions """
+        self._keypad_centers = []
+        self._keypad_text_blits = []
+        for i, kp_text in enumerate(self.keypad_texts_rendered):
+            row, column = divmod(i, 3)
+            kp = self.keypad_rows[row]
+            x = kp.xvalues[column]
+            y = kp.y
+            self._keypad_centers.append((row, column, x, y))
+            self._keypad_text_blits.append((kp_text, (x - kp_text.get_width() / 2,
+                                                      y - kp_text.get_height() / 2)))
+
         ctrl_word_text = ["HLT", "MI", "RI", "RO", "IAO", "IAI", "IBO", "IBI",
                           "AI", "AO", "EO", "SU", "BI", "OI", "CE", "CO", "JMP",
                           "FI", "JC", "JZ", "KEO", "ORE", "INS", "DES", "STO",
@@ -888,7 +1275,7 @@ class Game:
         self.prog_offsets = prog_offsets
         self.display_op = 0
 
-        self.memory_title = self._font_exobold.render("Memory:", True, self.TEXTGREY)
+        self.memory_title = convert_surface(self._font_exobold.render("Memory:", True, self.TEXTGREY))
         self.microins_title = self._font_exobold.render("Current instruction:", True, self.TEXTGREY)
 
         self.helptext_1 = "Press 'D' for debug mode.   Press 'C' to end debug mode.   Press 'M' to show/hide memory.   Press 'N' to show/hide microinstruction list.   Press 'R' for reset (won't clear RAM)."
@@ -909,12 +1296,12 @@ class Game:
         pygame.init()
         pygame.display.set_caption("8 bit computer")
 
-        self._screen = pygame.display.set_mode(self._size, pygame.HWSURFACE | pygame.DOUBLEBUF)
+        self._screen = pygame.display.set_mode(self._size)
         self._running = True
         
         self.setup_fonts()
 
-        self._bg = pygame.Surface(self._size)
+        self._bg = pygame.Surface(self._size).convert()
         self._bg.fill((20, 20, 20))
         self._clock = pygame.time.Clock()
 
@@ -1070,11 +1457,157 @@ class Game:
             memcolumn += text
 
             rowtext = f"{i*16:>03d}"
-            self.memrows.append(self._font_small_console_bold.render(rowtext, True, self.TEXTGREY))
+            self.memrows.append(render_cached(self._font_small_console_bold, rowtext, self.TEXTGREY))
         
-        self.memcolumn = self._font_small_console_bold.render(memcolumn, True, self.TEXTGREY)
+        self.memcolumn = convert_surface(self._font_small_console_bold.render(memcolumn, True, self.TEXTGREY))
+        memwidth = self.memcolumn.get_width()
+        titlewidth = self.memory_title.get_width()
+        self._memory_label_blits = [(self.memory_title, (1240 + memwidth/2 - titlewidth/2, 5)),
+                                    (self.memcolumn, (1240, 57 - 18))]
+        self._memory_label_blits += [(memrow, (1240 - 32, 57 + i*15)) for i, memrow in enumerate(self.memrows)]
 
         self._start_time = time.time()
+        self._plain_bg = self._bg.copy()
+        self.paint_static()
+        self.setup_dirty_rects()
+
+    def setup_dirty_rects(self):
+        """ Sets up the screen regions which are redrawn every frame. Only
+        these regions are restored from the background, everything else is
+        only drawn on the first frame. The LED displays are only updated on
+        the display in the frames where their value changes, and the memory
+        only when it has been written to.
+        """
+        self._region_rects = self.dirty_regions()
+        self._region_area = sum(rect.width*rect.height for rect in self._region_rects)
+        self._memory_rect = self.memory_rect()
+        self._dirty_rects = ([display.rect for display in self.bit_displays()]
+                             + self._region_rects + [self._memory_rect])
+        self._bg_blits = [(self._bg, rect, rect) for rect in self._dirty_rects]
+        self._changed_rects = []
+        self._mem_rect_version = None
+        self._full_update = True
+
+    def paint_static(self):
+        """ Paints everything that looks the same in every frame onto the
+        background: the titles and off LED's of the LED displays, the loaded
+        program text, and the memory and microinstruction titles if these are
+        shown. Repainted whenever the memory or microinstruction display is
+        toggled, after which the whole display is updated.
+        """
+        self._bg.blit(self._plain_bg, (0,0))
+        for display in self.bit_displays():
+            display.paint_static(self._bg)
+        self._display_cache = {}
+
+        self._bg.blit(self._loaded_program_text, (280,25))
+        if self.draw_mem:
+            self._bg.blits(self._memory_label_blits, doreturn = False)
+        if self.draw_ops:
+            self._bg.blit(self.microins_title, (1180, 620))
+        self._full_update = True
+
+    def draw_display(self, display, value):
+        """ Draws an LED display showing a value. The drawn LED's are copied
+        from the screen and blitted directly in the following frames, until
+        the value changes. The LED's are only updated on the display when the
+        value has changed.
+
+        Arguments:
+        display     -   The BitDisplay to draw.
+        value       -   The number to show on the display.
+        """
+        cached = self._display_cache.get(display)
+        if cached is not None and cached[0] == value:
+            self._screen.blit(cached[1], cached[2])
+            return
+
+        display.draw_number(value, self._screen)
+        rect = display.led_rect.clip(self._screen.get_rect())
+        self._display_cache[display] = (value, self._screen.subsurface(rect).copy(), rect)
+        self._changed_rects.append(rect)
+
+    def bit_displays(self):
+        """ Returns a list of the LED displays that are drawn every frame """
+        displays = [self.bus_display, self.cnt_display, self.areg_display,
+                    self.breg_display, self.sreg_display, self.flag_display,
+                    self.flgr_display, self.madd_display, self.mcon_display,
+                    self.insa_display, self.insb_display, self.outp_display,
+                    self.inpt_display, self.stap_display, self.ctrl_display,
+                    self.oprt_display, self.keypad0, self.keypad_div]
+        displays += self.keypad_rows
+        if self.use_LCD_display:
+            displays += [self.disd_display, self.disc_display]
+        return displays
+
+    def dirty_regions(self):
+        """ Returns a list of rectangles covering everything apart from the
+        LED displays and the memory that can change from one frame to the next.
+        """
+        rects = []
+
+        """ Control word labels """
+        label_height = max(text.get_height() for text in self.ctrl_word_text_rendered)
+        ctrl_bg = self.ctrl_display.reg_bg
+        rects.append(pygame.Rect(ctrl_bg.left - 20, self.ctrl_display.y,
+                                 ctrl_bg.width + 40, label_height*2 + 10))
+
+        """ Clock rate, FPS, clock cycles ran, loaded program and uptime """
+        text_width = max(self._loaded_program_text.get_width(),
+                         self._font.size("Clock cycles ran: 8888888888")[0])
+        rects.append(pygame.Rect(0, 0, 280 + text_width, 65))
+
+        """ Output display """
+        digits = max(3, len(str(2**self.cpubits - 1)))
+        out_width = max(self._font_segmentdisplay.size(c*digits)[0] for c in "0123456789")
+        out_height = self._font_segmentdisplay.get_height()
+        rects.append(pygame.Rect(980, 480, out_width + 35, out_height + 25))
+
+        """ Program """
+        rows = (self._height - 50)//15 + 1
+        columns = len(self.prog_texts_black)//rows + 1
+        rects.append(pygame.Rect(10, 30, 95*columns, self._height - 35))
+
+        """ Microinstruction list """
+        rects.append(pygame.Rect(1170, 620, self._width - 1170, 155))
+
+        if self.use_LCD_display:
+            rects.append(self.LCD_display.bg_border)
+
+        return rects
+
+    def memory_rect(self):
+        """ Returns the rectangle covered by the memory display """
+        x = 1240
+        y = 57
+        row_width = max(self._font_small_console.size(f"{c*2} "*16 + " ")[0]
+                        for c in "0123456789abcdef")
+        width = max(row_width, self.memcolumn.get_width())
+        return pygame.Rect(x - 32, 5, width + 32, y + 16*15 - 5)
+
+    def clear_screen(self):
+        """ Restores the background in the regions that are redrawn every
+        frame, or on the whole screen if the full display is to be updated.
+        """
+        if self._full_update:
+            self._screen.blit(self._bg, (0,0))
+        else:
+            self._screen.blits(self._bg_blits, doreturn = False)
+
+    def update_display(self):
+        """ Updates the dirty regions and the changed LED displays on the
+        display. The whole display is flipped on the first frame, after the
+        window has been exposed, and when the rectangles to update would cover
+        more than the whole screen anyway.
+        """
+        rects = self._region_rects + self._changed_rects
+        area = self._region_area + sum(rect.width*rect.height for rect in self._changed_rects)
+        if self._full_update or area > self._width*self._height:
+            pygame.display.flip()
+            self._full_update = False
+        else:
+            pygame.display.update(rects)
+        self._changed_rects = []
 
     def simple_line(self, pos1, pos2, color, shift1 = (0,0), shift2 = (0,0), width = 5):
         """ Draws a simple line to display connections between registers to the
@@ -1094,6 +1627,19 @@ class Game:
                          np.array(pos2) + shift2,
                          width = width)
 
+    def render_operation(self, operation):
+        """ Returns the rendered arrow and text listing the microinstructions
+        active in a control word. These are cached per control word.
+        """
+        if operation not in self._microop_render_cache:
+            s = "".join(f"{label:>8s} | " for instruction, label in zip(self.computer.microcodes,
+                                                                       self.computer.microcode_labels)
+                        if instruction & operation)
+            arrow = render_cached(self._font_small_console_bold, "> " + "_"*(len(s) - 4), self.DARKKGREEN)
+            out_text = render_cached(self._font_small_console, s[:-2], self.TEXTGREY)
+            self._microop_render_cache[operation] = (arrow, out_text)
+        return self._microop_render_cache[operation]
+
     def check_display_press(self, display, overlaytext):
         """ Checks if a (1 length) LED display object is pressed with the left
         mouse button. Also displays the LED.
@@ -1104,11 +1650,11 @@ class Game:
         y = display.y
         mouse_dist = (self.mouse_pos[0] - x)**2 + (self.mouse_pos[1] - y)**2
         if mouse_dist < self.keypad0.radius**2:
-            if pygame.mouse.get_pressed()[0]:
+            if self.mouse_down:
                 pressed = 1
         text_x = x - overlaytext.get_width() / 2
         text_y = y - overlaytext.get_height() / 2
-        display.draw_number(pressed, self._screen)
+        self.draw_display(display, pressed)
         self._screen.blit(overlaytext, (text_x, text_y))
 
         return pressed
@@ -1121,6 +1667,9 @@ class Game:
         if event.type == pygame.QUIT:
             self._running = False
 
+        if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+            self._full_update = True
+
         self.keys_pressed = list(pygame.key.get_pressed())
 
         if event.type == pygame.KEYDOWN:
@@ -1144,6 +1693,8 @@ class Game:
                 # clean mode (no debug)
                 self.draw_mem = False
                 self.draw_ops = False
+            if event.key in (pygame.K_m, pygame.K_n, pygame.K_d, pygame.K_c):
+                self.paint_static()
 
             if event.key == pygame.K_KP_PLUS:
                 self.target_HZ = int(self.target_HZ*2)
@@ -1189,14 +1740,13 @@ class Game:
                 if self.use_LCD_display: self.update_LCD_display()
 
     def loop(self):
-        self.mouse_pos = np.array(pygame.mouse.get_pos())
-        keypressed = np.where(self.keypad == 1)
+        self.mouse_pos = pygame.mouse.get_pos()
+        self.mouse_down = pygame.mouse.get_pressed()[0]
 
         if not hasattr(self, "kbcol"):
             input_val = 0
-            if np.sum(self.keypad) != 0:
-                rowpressed = keypressed[0][0]
-                colpressed = keypressed[1][0]
+            if 1 in self.keypad:
+                rowpressed, colpressed = divmod(self.keypad.index(1), 3)
                 if rowpressed < 3:
                     input_val = 3*(2 - rowpressed) + colpressed + 1
                 else:
@@ -1213,14 +1763,16 @@ class Game:
             self.computer.input_regi = input_val
 
         HZ_multiplier = self.HZ_multiplier
-        if self.target_HZ >= self.target_FPS:
+        if self.target_HZ >= self.target_FPS and self.autorun:
+            if self.use_LCD_display:
+                self.computer.run_cycles(HZ_multiplier, self.update_LCD_display)
+            else:
+                self.computer.run_cycles(HZ_multiplier)
+        elif self.target_HZ >= self.target_FPS:
+            """ Not running, so the computer is only updated """
+            update = self.computer.update
             for i in range(HZ_multiplier):
-                self.computer.update()
-                if self.autorun:
-                    self.computer.clock_high()
-                    self.computer.update()
-                    if self.use_LCD_display: self.update_LCD_display()
-                    self.computer.clock_low()
+                update()
         else:
             frames_per_cycle = self.target_FPS/self.target_HZ
             self.computer.update()
@@ -1232,8 +1784,9 @@ class Game:
                     self.computer.clock_low()
                     self.cyclecounts += 1
         
-        if self.draw_mem:
+        if self.draw_mem and self._mem_strings_version != self.computer.mem_version:
             self.computer.get_mem_strings()
+            self._mem_strings_version = self.computer.mem_version
 
         self.step += 1
         if self.step >= self.fps:
@@ -1258,47 +1811,44 @@ class Game:
         self.fpstext = self._font.render(f"{int(self.fps):d} FPS", True, self.TEXTGREY)
 
     def draw_memory(self):
-        memwidth = self.memcolumn.get_width()
-        titlewidth = self.memory_title.get_width()
+        """ Draws the memory contents. The titles and row labels are painted
+        on the background.
+        """
         x = 1240
         y = 57
-        self._screen.blit(self.memory_title, (x + memwidth/2 - titlewidth/2, 5))
-        self._screen.blit(self.memcolumn, (x, y - 18))
-        for i, item in enumerate(self.computer.mem_strings):
-            out_text = self._font_small_console.render(item, True, self.TEXTGREY)
-            self._screen.blit(out_text, (x, y))
-            self._screen.blit(self.memrows[i], (x - 32, y))
-            y += 15
+        self._screen.blits([(render_cached(self._font_small_console, item, self.TEXTGREY), (x, y + i*15))
+                            for i, item in enumerate(self.computer.mem_strings)],
+                           doreturn = False)
 
     def render(self):
-        self._screen.blit(self._bg, (0,0))
+        self.clear_screen()
 
         """ Draw LED displays """
         #self.clk_display.draw_number(self.computer.timer_indicator, self._screen)
-        self.bus_display.draw_number(self.computer.bus, self._screen)
-        self.cnt_display.draw_number(self.computer.prog_count, self._screen)
-        self.areg_display.draw_number(self.computer.areg, self._screen)
-        self.breg_display.draw_number(self.computer.breg, self._screen)
-        self.sreg_display.draw_number(self.computer.sumreg, self._screen)
-        self.flag_display.draw_number(self.computer.flags, self._screen)
-        self.flgr_display.draw_number(self.computer.flagreg, self._screen)
-        self.madd_display.draw_number(self.computer.memaddress, self._screen)
-        self.mcon_display.draw_number(self.computer.memcontent, self._screen)
-        self.insa_display.draw_number(self.computer.inst_reg_a, self._screen)
-        self.insb_display.draw_number(self.computer.inst_reg_b, self._screen)
-        self.outp_display.draw_number(self.computer.out_regist, self._screen)
-        self.inpt_display.draw_number(self.computer.input_regi, self._screen)
-        self.stap_display.draw_number(self.computer.stackpointer, self._screen)
+        self.draw_display(self.bus_display, self.computer.bus)
+        self.draw_display(self.cnt_display, self.computer.prog_count)
+        self.draw_display(self.areg_display, self.computer.areg)
+        self.draw_display(self.breg_display, self.computer.breg)
+        self.draw_display(self.sreg_display, self.computer.sumreg)
+        self.draw_display(self.flag_display, self.computer.flags)
+        self.draw_display(self.flgr_display, self.computer.flagreg)
+        self.draw_display(self.madd_display, self.computer.memaddress)
+        self.draw_display(self.mcon_display, self.computer.memcontent)
+        self.draw_display(self.insa_display, self.computer.inst_reg_a)
+        self.draw_display(self.insb_display, self.computer.inst_reg_b)
+        self.draw_display(self.outp_display, self.computer.out_regist)
+        self.draw_display(self.inpt_display, self.computer.input_regi)
+        self.draw_display(self.stap_display, self.computer.stackpointer)
 
         """ LCD display registers """
         if self.use_LCD_display:
-            self.disd_display.draw_number(self.computer.screen_data, self._screen)
-            self.disc_display.draw_number(self.computer.screen_control, self._screen)
+            self.draw_display(self.disd_display, self.computer.screen_data)
+            self.draw_display(self.disc_display, self.computer.screen_control)
 
         """ Draw and check the numpad buttons for input """
         i = 0
         for kp, num in zip(self.keypad_rows, self.keypad_numbers):
-            kp.draw_number(num, self._screen)
+            self.draw_display(kp, num)
             self.keypad_numbers[i] = 0
             i += 1
 
@@ -1307,40 +1857,37 @@ class Game:
         self.keypad_div_pressed = self.check_display_press(self.keypad_div,
                                                            self.keypad_texts_div)
         
-        self.keypad[:,:] = 0
-        mouse_pressed = pygame.mouse.get_pressed()[0]
-        for i, kp_text in enumerate(self.keypad_texts_rendered):
-            column = i%3
-            row = i//3
-            kp = self.keypad_rows[row]
-            x = kp.xvalues[column]
-            y = kp.y
-            if mouse_pressed:
+        self.keypad = [0]*12
+        if self.mouse_down:
+            for row, column, x, y in self._keypad_centers:
                 mouse_dist = (self.mouse_pos[0] - x)**2 + (self.mouse_pos[1] - y)**2
-                if mouse_dist < kp.radius**2:
+                if mouse_dist < self.keypad_rows[row].radius**2:
                     self.keypad_numbers[row] = 2**(2 - column)
-                    self.keypad[row, column] = 1
-            text_x = x - kp_text.get_width() / 2
-            text_y = y - kp_text.get_height() / 2
-            self._screen.blit(kp_text, (text_x, text_y))
-
-        """ Draw the output display """
-        out_string = f"{self.computer.out_regist:>03d}"
-        out_text = self._font_segmentdisplay.render(out_string, True, self.BRIGHTRED)
-        screen_bg = pygame.Rect(980, 480, out_text.get_width() + 35, out_text.get_height() + 25)
-        pygame.draw.rect(self._screen, self.BLACK, screen_bg, border_radius = 10)
-        self._screen.blit(out_text, (1000, 500))
+                    self.keypad[3*row + column] = 1
+        self._screen.blits(self._keypad_text_blits, doreturn = False)
+
+        """ Draw the output display, which is only redrawn when the output
+        register changes
+        """
+        if self.computer.out_regist != self._out_regist_rendered:
+            out_string = f"{self.computer.out_regist:>03d}"
+            out_text = render_cached(self._font_segmentdisplay, out_string, self.BRIGHTRED)
+            self._out_display = convert_surface(pygame.Surface((out_text.get_width() + 35, out_text.get_height() + 25),
+                                                               pygame.SRCALPHA))
+            pygame.draw.rect(self._out_display, self.BLACK, self._out_display.get_rect(), border_radius = 10)
+            self._out_display.blit(out_text, (20, 20))
+            self._out_regist_rendered = self.computer.out_regist
+        self._screen.blit(self._out_display, (980, 480))
 
         """ Draw the control word LED display, and the labels """
-        self.ctrl_display.draw_number(self.computer.controlword, self._screen)
+        self.draw_display(self.ctrl_display, self.computer.controlword)
         for text, x_center in zip(self.ctrl_word_text_rendered, self.ctrl_display.xvalues):
             text_x = int(x_center - text.get_width()/2)
             text_y = int(self.ctrl_display.y + text.get_height()) + 5
             self._screen.blit(text, (text_x, text_y))
 
         """ Draw the operation timestep LED display """
-        operation = int("1" + "0"*self.computer.op_timestep)
-        self.oprt_display.draw_bits(operation, self._screen)
+        self.draw_display(self.oprt_display, 1 << self.computer.op_timestep)
 
         """ If the timestep is zero, update which instruction from the program
         is the active one (to draw with green)
@@ -1363,50 +1910,42 @@ class Game:
         """ Draw the memory """
         if self.draw_mem:
             self.draw_memory()
+            if self.computer.mem_version != self._mem_rect_version:
+                self._changed_rects.append(self._memory_rect)
+                self._mem_rect_version = self.computer.mem_version
 
         """ Draw the operations included in the current instruction """
         if self.draw_ops:
-            self._screen.blit(self.microins_title, (1180, 620))
             if self.computer.op_timestep >= 2:
                 self.op_address_draw = self.computer.inst_reg_a
-            operations = self.computer.assembly[self.op_address_draw].copy()
-            operations.insert(0, self.computer.RO|self.computer.IAI|self.computer.CE)
-            operations.insert(0, self.computer.CO|self.computer.MI)
+            operations = self.computer.assembly_with_prefix[self.op_address_draw]
             for i, operation in enumerate(operations):
                 if (i >= 2 and self.computer.op_timestep < 2):
                     continue
-                s = ""
-                for instruction, label in zip(self.computer.microcodes, self.computer.microcode_labels):
-                    if instruction & operation:
-                        s += f"{label:>8s} | "
-                self.arrow = self._font_small_console_bold.render("> " + "_"*(len(s) - 4), "True", self.DARKKGREEN)
+                self.arrow, out_text = self.render_operation(operation)
                 if i == self.computer.op_timestep:
                     self._screen.blit(self.arrow, (1170, 650 + i*15))
-                out_text = self._font_small_console.render(s[:-2], True, self.TEXTGREY)
                 self._screen.blit(out_text, (1180, 650 + i*15))
 
-        self._text_cycles_ran = self._font.render(f"Clock cycles ran: {self.computer.clockcycles_ran:>10d}", True, self.TEXTGREY)
-
-        uptime = time.time() - self._start_time
-        hours = uptime/3600
-        minutes = (hours - np.floor(hours))*60
-        seconds = (minutes - np.floor(minutes))*60
+        if self.computer.clockcycles_ran != self._cycles_ran_rendered:
+            self._text_cycles_ran = self._font.render(f"Clock cycles ran: {self.computer.clockcycles_ran:>10d}", True, self.TEXTGREY)
+            self._cycles_ran_rendered = self.computer.clockcycles_ran
 
-        hours = int(np.floor(hours))
-        minutes = int(np.floor(minutes))
-        seconds = int(np.floor(seconds))
-
-        self._text_uptime = self._font.render(f"Uptime: {hours:>02d}:{minutes:>02d}:{seconds:>02d}", True, self.TEXTGREY)
+        uptime = int(time.time() - self._start_time)
+        if uptime != self._uptime_rendered:
+            minutes, seconds = divmod(uptime, 60)
+            hours, minutes = divmod(minutes, 60)
+            self._text_uptime = self._font.render(f"Uptime: {hours:>02d}:{minutes:>02d}:{seconds:>02d}", True, self.TEXTGREY)
+            self._uptime_rendered = uptime
 
         self._screen.blit(self.clockrate, (5,5))
         self._screen.blit(self.fpstext, (100,5))
         self._screen.blit(self._text_cycles_ran, (280,5))
-        self._screen.blit(self._loaded_program_text, (280,25))
         self._screen.blit(self._text_uptime, (280,45))
 
         if self.use_LCD_display: self.LCD_display.render(self._screen)
 
-        pygame.display.flip()
+        self.update_display()
 
     def cleanup(self):
         pygame.quit()
@@ -1443,7 +1982,7 @@ class LCD_display:
         self.lettercolor = (0, 0, 0)
         self.bgcolor = (210, 235, 100)
 
-        self.cursor = self.font.render("_", True, self.lettercolor)
+        self.cursor = convert_surface(self.font.render("_", True, self.lettercolor))
 
         symbol = font.render("0", True, self.lettercolor)
         self.symbolheight = symbol.get_height()
@@ -1458,6 +1997,20 @@ class LCD_display:
                                      self.pixelsize[0] + 10, self.pixelsize[1] + 10)
 
         self.memory = np.zeros(128, dtype = int)
+        self._undrawable = set() # values that failed to render, so they aren't retried
+
+    def render_character(self, value):
+        """ Returns the rendered character for a value, or None if it can't
+        be drawn. Rendered characters are cached by render_cached.
+        """
+        value = int(value)
+        if value in self._undrawable:
+            return None
+        try:
+            return render_cached(self.font, chr(value), self.lettercolor)
+        except (ValueError, pygame.error):
+            self._undrawable.add(value) # null and zero width characters aren't drawn
+            return None
 
     def enable_set(self):
         if 0b01000000 & self.control:
@@ -1481,8 +2034,8 @@ class LCD_display:
                 pass
             elif 0b00010000 & self.data:
                 """ Cursor and shift control """
-                if int(bin(self.data)[-4]):
-                    if int(bin(self.data)[-3]):
+                if (self.data >> 3)&1:
+                    if (self.data >> 2)&1:
                         self.shift += 1
                     else:
                         self.shift -= 1
@@ -1495,12 +2048,12 @@ class LCD_display:
                 """ Display on/off control
                     Always on
                 """
-                self.cursoron = int(bin(self.data)[-2])
-                self.cursorblink = int(bin(self.data)[-1])
+                self.cursoron = (self.data >> 1)&1
+                self.cursorblink = self.data&1
             elif 0b00000100 & self.data:
                 """ Entry mode set """
-                self.cursor_dir = int(bin(self.data)[-2])
-                self.shifting = int(bin(self.data)[-1])
+                self.cursor_dir = (self.data >> 1)&1
+                self.shifting = self.data&1
             elif 0b00000010 & self.data:
                 """ Return home """
                 self.cursor_pos = 0
@@ -1533,12 +2086,10 @@ class LCD_display:
 
         cursor = self.cursor
 
-        if time.time() - self.time > 0.5:
-            if self.cursordraw:
-                self.cursordraw = False
-            else:
-                self.cursordraw = True
-            self.time = time.time()
+        now = time.time()
+        if now - self.time > 0.5:
+            self.cursordraw = not self.cursordraw
+            self.time = now
 
         row1 = self.memory[0:40]
         row2 = self.memory[64:104]
@@ -1553,12 +2104,9 @@ class LCD_display:
             for j, val in enumerate(vals):
                 y = 2 + (self.symbolheight + 4)*j + self.position[1]
 
-                character = chr(val)
-                try:
-                    text = self.font.render(character, True, self.lettercolor)
+                text = self.render_character(val)
+                if text is not None:
                     screen.blit(text, (x, y))
-                except ValueError as e:
-                    pass # null characters aren't drawn
 
                 if self.cursordraw and self.cursoron:
                     if (self.cursor_pos + self.shift) == i + 64*j:
@@ -9,7 +9,7 @@ from pygame.display import update
 from pygame.locals import *
 import numpy as np
 
-from cpu_sim import BitDisplay, draw_circle
+from cpu_sim import BitDisplay, draw_circle, FONT_DIR
 
 gate_update_chance = 0.5 # chance that a gate will update according to its input on each tick, use to simulate gate delay
 update_to_1 = True # whether the gate_update_chance will be set to 1 after a certain amount of time
@@ -1124,10 +1124,10 @@ class Game:
 
     def setup_fonts(self):
         pygame.font.init()
-        self._font_exobold = pygame.font.Font(os.path.join(os.getcwd(), "font", "ExoBold-qxl5.otf"), 19)
-        self._font_exobold_small = pygame.font.Font(os.path.join(os.getcwd(), "font", "ExoBold-qxl5.otf"), 13)
-        self._font_brush = pygame.font.Font(os.path.join(os.getcwd(), "font", "BrushSpidol.otf"), 25)
-        self._font_segmentdisplay = pygame.font.Font(os.path.join(os.getcwd(), "font", "28segment.ttf"), 80)
+        self._font_exobold = pygame.font.Font(os.path.join(FONT_DIR, "ExoBold-qxl5.otf"), 19)
+        self._font_exobold_small = pygame.font.Font(os.path.join(FONT_DIR, "ExoBold-qxl5.otf"), 13)
+        self._font_brush = pygame.font.Font(os.path.join(FONT_DIR, "BrushSpidol.otf"), 25)
+        self._font_segmentdisplay = pygame.font.Font(os.path.join(FONT_DIR, "28segment.ttf"), 80)
         self._font_console_bold = pygame.font.SysFont("monospace", 17, bold = True)
         self._font_small_console = pygame.font.SysFont("monospace", 12)
         self._font_small_console_bold = pygame.font.SysFont("monospace", 12, bold = True)
@@ -1135,11 +1135,11 @@ class Game:
         self._font_verysmall_console_bold = pygame.font.SysFont("monospace", 10, bold = True)
         self._font_veryverysmall_console = pygame.font.SysFont("monospace", 9)
         self._font_veryverysmall_console_bold = pygame.font.SysFont("monospace", 9, bold = True)
-        self._font_small = pygame.font.Font(os.path.join(os.getcwd(), "font", "Amble-Bold.ttf"), 11)
-        self._font = pygame.font.Font(os.path.join(os.getcwd(), "font", "Amble-Bold.ttf"), 16)
-        self._font_large = pygame.font.Font(os.path.join(os.getcwd(), "font", "Amble-Bold.ttf"), 25)
-        self._font_larger = pygame.font.Font(os.path.join(os.getcwd(), "font", "Amble-Bold.ttf"), 45)
-        self._font_verylarge = pygame.font.Font(os.path.join(os.getcwd(), "font", "Amble-Bold.ttf"), 64)
+        self._font_small = pygame.font.Font(os.path.join(FONT_DIR, "Amble-Bold.ttf"), 11)
+        self._font = pygame.font.Font(os.path.join(FONT_DIR, "Amble-Bold.ttf"), 16)
+        self._font_large = pygame.font.Font(os.path.join(FONT_DIR, "Amble-Bold.ttf"), 25)
+        self._font_larger = pygame.font.Font(os.path.join(FONT_DIR, "Amble-Bold.ttf"), 45)
+        self._font_verylarge = pygame.font.Font(os.path.join(FONT_DIR, "Amble-Bold.ttf"), 64)
 
     def twobutton_gate(self, pos = (0,0), gatetype = AndGate):
         scene = Scene(self._screen)
@@ -1195,14 +1195,14 @@ class Game:
         pygame.init()
         pygame.display.set_caption("Learn CPU")
 
-        self._screen = pygame.display.set_mode(self._size, pygame.HWSURFACE | pygame.DOUBLEBUF)
+        self._screen = pygame.display.set_mode(self._size)
         self._running = True
         self.mouse_pos = np.array(pygame.mouse.get_pos())
         self.start_time = time.time()
         
         self.setup_fonts()
 
-        self._bg = pygame.Surface(self._size)
+        self._bg = pygame.Surface(self._size).convert()
         self._bg.fill((20, 20, 20))
         self._clock = pygame.time.Clock()
 